@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import UserProfile, MusicHistory
+from .models import UserProfile, MusicHistory, RenderJob
 
 admin.site.register(UserProfile)
 admin.site.register(MusicHistory)
+admin.site.register(RenderJob)
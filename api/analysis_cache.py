@@ -0,0 +1,234 @@
+"""
+Text Analysis Cache
+Two-tier (in-process LRU + shared Django cache) memoization of sentiment/mood results
+"""
+
+import functools
+import hashlib
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_MISSING = object()
+
+# Every AnalysisCache in the process, for clear_analysis_caches()
+_caches = weakref.WeakSet()
+_enabled = True
+
+
+def normalize_text(text, casefold=True):
+    """
+    Cache key form of a prompt: trimmed, whitespace collapsed and
+    (for case-insensitive analyzers) case-folded
+
+    Tokenizers and TextBlob ignore runs of whitespace, and the keyword
+    analyzers lowercase text anyway, so prompts that differ only in these
+    ways share one entry. Cased transformer models keep case in the key.
+    """
+    text = _WHITESPACE_RE.sub(' ', text).strip()
+    return text.casefold() if casefold else text
+
+
+def get_cache_settings():
+    """
+    Cache sizes and lifetimes, overridable from Django settings
+    """
+    defaults = {
+        'lru_size': 4096,
+        'ttl': 7 * 24 * 3600,
+        'alias': 'analysis',
+    }
+    try:
+        from django.conf import settings
+        return {
+            'lru_size': getattr(settings, 'ANALYSIS_CACHE_LRU_SIZE', defaults['lru_size']),
+            'ttl': getattr(settings, 'ANALYSIS_CACHE_TTL', defaults['ttl']),
+            'alias': getattr(settings, 'ANALYSIS_CACHE_ALIAS', defaults['alias']),
+        }
+    except Exception:
+        # Scripts that use the analyzers without configuring Django
+        return defaults
+
+
+def set_cache_enabled(enabled):
+    """
+    Turn every analysis cache on or off for this process
+
+    Evaluation scripts disable caching so each run really calls the models.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def clear_analysis_caches():
+    """
+    Drop the in-process tier of every analysis cache
+    """
+    for cache in list(_caches):
+        cache.clear()
+
+
+def _shared_cache(alias):
+    """
+    Django cache backend for the shared tier, or None outside Django or
+    when the alias is not configured
+    """
+    try:
+        from django.core.cache import caches
+        return caches[alias]
+    except Exception:
+        return None
+
+
+class AnalysisCache:
+    """
+    Memoize text analysis results by normalized text
+
+    Lookups go to a per-process LRU first (a dict hit, microseconds), then
+    to the shared Django cache, so every worker and process benefits from
+    a result computed once. Entries expire after ttl seconds in both tiers.
+    Keys carry the analyzer's version (model id, quantization, rules
+    revision), so changing the model never serves stale results. version
+    may be a callable; it is evaluated on every lookup, so settings that
+    change at runtime (MODEL_QUANTIZE) switch to separate entries. Cached
+    results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, namespace, version, lru_size=None, ttl=None, casefold=True):
+        options = get_cache_settings()
+        self.namespace = namespace
+        self.version = version
+        self.casefold = casefold
+        self.lru_size = options['lru_size'] if lru_size is None else lru_size
+        self.ttl = options['ttl'] if ttl is None else ttl
+        self.alias = options['alias']
+        self._lru = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def current_version(self):
+        return str(self.version() if callable(self.version) else self.version)
+
+    def key(self, text, version=None):
+        digest = hashlib.sha256(normalize_text(text, self.casefold).encode('utf-8')).hexdigest()
+        return f"analysis:{self.namespace}:{version or self.current_version()}:{digest}"
+
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] < time.monotonic():
+                del self._lru[key]
+                return _MISSING
+            self._lru.move_to_end(key)
+            return entry[1]
+
+    def _lru_set(self, key, value):
+        if self.lru_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._lru[key] = (expires_at, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get_many(self, texts):
+        """
+        {index: cached value} for the texts that hit either tier
+        """
+        version = self.current_version()
+        keys = [self.key(text, version) for text in texts]
+        found = {}
+        missing = {}
+        for index, key in enumerate(keys):
+            value = self._lru_get(key)
+            if value is _MISSING:
+                missing.setdefault(key, []).append(index)
+            else:
+                found[index] = value
+
+        shared = _shared_cache(self.alias) if missing else None
+        if shared is not None:
+            try:
+                hits = shared.get_many(list(missing))
+            except Exception:
+                hits = {}
+            for key, value in hits.items():
+                self._lru_set(key, value)
+                for index in missing[key]:
+                    found[index] = value
+        return found
+
+    def set_many(self, items):
+        """
+        Store {text: value} in both tiers
+        """
+        version = self.current_version()
+        entries = {self.key(text, version): value for text, value in items.items()}
+        for key, value in entries.items():
+            self._lru_set(key, value)
+        shared = _shared_cache(self.alias)
+        if shared is not None and entries:
+            try:
+                shared.set_many(entries, timeout=self.ttl)
+            except Exception:
+                pass
+
+    def get_or_compute(self, texts, compute_batch):
+        """
+        Results for texts, running compute_batch only on the cache misses
+
+        compute_batch takes a list of texts and returns one result per text.
+        Duplicate texts within a call are computed once. With caching
+        disabled (set_cache_enabled) every text is computed.
+        """
+        texts = list(texts)
+        if not _enabled:
+            return list(compute_batch(texts)) if texts else []
+        results = self.get_many(texts)
+        pending = {}
+        for index, text in enumerate(texts):
+            if index not in results:
+                pending.setdefault(normalize_text(text, self.casefold), []).append(index)
+        if pending:
+            representatives = [texts[indexes[0]] for indexes in pending.values()]
+            computed = compute_batch(representatives)
+            self.set_many(dict(zip(representatives, computed)))
+            for indexes, value in zip(pending.values(), computed):
+                for index in indexes:
+                    results[index] = value
+        return [results[index] for index in range(len(texts))]
+
+    def clear(self):
+        """
+        Drop the in-process tier (shared entries expire on their own)
+        """
+        with self._lock:
+            self._lru.clear()
+
+
+def cached_analysis(namespace, version):
+    """
+    Decorator memoizing a single-text analysis function through an AnalysisCache
+
+    Empty or non-string input bypasses the cache. The cache is reachable
+    as wrapper.cache.
+    """
+    def decorator(func):
+        cache = AnalysisCache(namespace, version)
+
+        @functools.wraps(func)
+        def wrapper(text):
+            if not isinstance(text, str) or not text.strip():
+                return func(text)
+            return cache.get_or_compute([text], lambda texts: [func(texts[0])])[0]
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -0,0 +1,199 @@
+"""
+Audio Encoders
+Pluggable output encoders (WAV, FLAC, Ogg Vorbis, Opus, MP3) for generated clips
+"""
+
+import os
+import tempfile
+from dataclasses import dataclass
+from math import gcd
+from typing import Optional, Tuple
+
+from .lazy_imports import lazy_import, module_available
+
+# soundfile loads on first use; scipy.signal is imported where resampling happens
+sf = lazy_import('soundfile')
+SOUNDFILE_AVAILABLE = sf is not None
+SCIPY_AVAILABLE = module_available('scipy')
+
+
+@dataclass(frozen=True)
+class AudioEncoder:
+    """
+    One output format written through libsndfile
+
+    subtype=None means "lossless PCM at the render's sample format" and
+    falls back to 24-bit when the container cannot hold that format (FLAC
+    has no float). sample_rates restricts the output rate; clips are
+    resampled to the nearest supported rate when needed (Opus).
+    """
+
+    name: str
+    extension: str
+    content_type: str
+    format: str
+    subtype: Optional[str] = None
+    sample_rates: Tuple[int, ...] = ()
+    aliases: Tuple[str, ...] = ()
+
+    def available(self):
+        """
+        Whether the installed libsndfile can write this format
+        """
+        if not SOUNDFILE_AVAILABLE or self.format not in sf.available_formats():
+            return False
+        if self.subtype is not None and self.subtype not in sf.available_subtypes(self.format):
+            return False
+        if self.sample_rates and not SCIPY_AVAILABLE:
+            return False
+        return True
+
+    def subtype_for(self, pcm_subtype):
+        """
+        libsndfile subtype to write, given the render's PCM subtype
+        """
+        if self.subtype is not None:
+            return self.subtype
+        if sf.check_format(self.format, pcm_subtype):
+            return pcm_subtype
+        return 'PCM_24'
+
+    def output_rate(self, sample_rate):
+        """
+        Sample rate the encoded file will use
+        """
+        if not self.sample_rates or sample_rate in self.sample_rates:
+            return sample_rate
+        higher = [rate for rate in self.sample_rates if rate >= sample_rate]
+        return min(higher) if higher else max(self.sample_rates)
+
+    def matches(self, content_type):
+        """
+        Whether a media type from an Accept header selects this encoder
+        """
+        return content_type == self.content_type or content_type in self.aliases
+
+
+# Registered encoders, in preference order for Accept negotiation
+AUDIO_ENCODERS = {}
+
+
+def register_encoder(encoder):
+    """
+    Add (or replace) an output encoder
+    """
+    AUDIO_ENCODERS[encoder.name] = encoder
+    return encoder
+
+
+register_encoder(AudioEncoder('wav', 'wav', 'audio/wav', 'WAV',
+                              aliases=('audio/wave', 'audio/x-wav')))
+register_encoder(AudioEncoder('flac', 'flac', 'audio/flac', 'FLAC',
+                              aliases=('audio/x-flac',)))
+register_encoder(AudioEncoder('opus', 'opus', 'audio/ogg', 'OGG', 'OPUS',
+                              sample_rates=(8000, 12000, 16000, 24000, 48000),
+                              aliases=('audio/opus', 'audio/ogg; codecs=opus')))
+register_encoder(AudioEncoder('ogg', 'ogg', 'audio/ogg', 'OGG', 'VORBIS',
+                              aliases=('audio/vorbis', 'audio/ogg; codecs=vorbis')))
+# MP3 needs libsndfile >= 1.1 built with LAME; available() reports it
+register_encoder(AudioEncoder('mp3', 'mp3', 'audio/mpeg', 'MP3', 'MPEG_LAYER_III',
+                              aliases=('audio/mp3',)))
+
+
+def get_encoder(name):
+    """
+    Available encoder by name, or None
+    """
+    encoder = AUDIO_ENCODERS.get((name or "").lower())
+    if encoder is None or not encoder.available():
+        return None
+    return encoder
+
+
+def encoder_for_filename(filename):
+    """
+    Encoder whose extension matches filename, or None
+    """
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    for encoder in AUDIO_ENCODERS.values():
+        if encoder.extension == extension:
+            return encoder
+    return None
+
+
+def negotiate_encoder(accept_header, default='wav'):
+    """
+    Pick the available encoder preferred by an HTTP Accept header
+
+    Explicit media types are honoured in q-value order; wildcards
+    (audio/*, */*) and an empty header select the default.
+    """
+    ranges = []
+    for position, item in enumerate((accept_header or "").split(',')):
+        parts = [part.strip() for part in item.split(';')]
+        media_type = parts[0].lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        params = []
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+            else:
+                params.append(f"{key.strip().lower()}={value.strip().lower()}")
+        if quality <= 0:
+            continue
+        full_type = '; '.join([media_type] + params)
+        ranges.append((-quality, position, media_type, full_type))
+
+    for _, _, media_type, full_type in sorted(ranges):
+        if media_type in ('audio/*', '*/*'):
+            return get_encoder(default)
+        # Codec-qualified types (audio/ogg; codecs=vorbis) beat the bare type
+        for candidate in (full_type, media_type):
+            for encoder in AUDIO_ENCODERS.values():
+                if encoder.matches(candidate) and encoder.available():
+                    return encoder
+
+    return get_encoder(default)
+
+
+def transcode(source_path, target_path, encoder, block_size=65536):
+    """
+    Encode the clip at source_path into target_path with encoder
+
+    Same-rate encodes stream block by block; a rate change reads the clip
+    once and resamples it with a polyphase filter. The file appears at
+    target_path atomically, so concurrent requests for the same rendition
+    never see a partial file.
+    """
+    info = sf.info(source_path)
+    out_rate = encoder.output_rate(info.samplerate)
+    subtype = encoder.subtype_for(info.subtype)
+
+    fd, temp_path = tempfile.mkstemp(suffix=f".{encoder.extension}.tmp",
+                                     dir=os.path.dirname(target_path) or '.')
+    os.close(fd)
+    try:
+        with sf.SoundFile(temp_path, 'w', samplerate=out_rate, channels=info.channels,
+                          format=encoder.format, subtype=subtype) as out:
+            if out_rate == info.samplerate:
+                for block in sf.blocks(source_path, blocksize=block_size, dtype='float32'):
+                    out.write(block)
+            else:
+                from scipy import signal
+
+                data, _ = sf.read(source_path, dtype='float32')
+                factor = gcd(out_rate, info.samplerate)
+                data = signal.resample_poly(data, out_rate // factor, info.samplerate // factor, axis=0)
+                out.write(data.astype('float32'))
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return target_path
@@ -4,9 +4,19 @@ Generates 40-second audio clips based on detected mood and sentiment
 """
 
 import numpy as np
-import random
 import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
 from datetime import datetime
+from typing import Optional
+
+from .audio_encoders import get_encoder, transcode
+from .render_cache import RenderCache
 
 # Import required libraries with fallback
 try:
@@ -23,18 +33,342 @@ except ImportError:
     SCIPY_AVAILABLE = False
     signal = None
 
+# Bump whenever synthesis changes so cached renders are not reused
+ENGINE_VERSION = 2
+
+# Samples are synthesized and processed as float32 end to end
+DTYPE = np.float32
+
+# Output sample formats: request name -> libsndfile subtype
+SAMPLE_FORMATS = {
+    'pcm16': 'PCM_16',
+    'pcm24': 'PCM_24',
+    'float32': 'FLOAT',
+}
+
+class SampleBank:
+    """
+    Process-wide cache of filter designs and pre-rendered drum one-shots
+    
+    Built lazily and shared by every generation, so per-request rhythm and
+    filter work is just mixing. Coefficients and one-shots are stored as
+    float32 so filtering and mixing never upcast the float32 render path.
+    SOS coefficients are keyed by (sample_rate, filter type, cutoff,
+    order) and drum one-shots by (sample_rate, kind, variant); noisy drums
+    keep a small pool of noise variants so repeated hits do not sound
+    identical.
+    """
+    
+    NOISE_VARIANTS = 8
+    MAX_FILTERS = 256
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._filters = OrderedDict()
+        self._drums = {}
+    
+    def sos(self, sample_rate, btype, cutoff, order):
+        """
+        Butterworth SOS coefficients, designed once per key
+        """
+        key = (sample_rate, btype, float(cutoff), order)
+        with self._lock:
+            sos = self._filters.get(key)
+            if sos is not None:
+                self._filters.move_to_end(key)
+                return sos
+        
+        sos = signal.butter(order, cutoff, btype, fs=sample_rate, output='sos').astype(DTYPE)
+        
+        with self._lock:
+            self._filters[key] = sos
+            if len(self._filters) > self.MAX_FILTERS:
+                self._filters.popitem(last=False)
+        return sos
+    
+    def drum(self, sample_rate, kind, variant=0):
+        """
+        Pre-rendered one-shot for a drum kind ('kick', 'snare' or 'hihat')
+        """
+        key = (sample_rate, kind, variant % self.NOISE_VARIANTS)
+        one_shot = self._drums.get(key)
+        if one_shot is None:
+            with self._lock:
+                one_shot = self._drums.get(key)
+                if one_shot is None:
+                    one_shot = self._render_drum(sample_rate, kind, key[2]).astype(DTYPE)
+                    one_shot.flags.writeable = False
+                    self._drums[key] = one_shot
+        return one_shot
+    
+    def warm(self, sample_rate):
+        """
+        Pre-render every drum variant and the filters used by the effect chains
+        """
+        for cutoff, btype, order in ((2000, 'high', 2), (8000, 'high', 4),
+                                     (2000, 'low', 4), (4000, 'low', 4)):
+            self.sos(sample_rate, btype, cutoff, order)
+        for kind in ('kick', 'snare', 'hihat'):
+            for variant in range(self.NOISE_VARIANTS):
+                self.drum(sample_rate, kind, variant)
+    
+    def _render_drum(self, sample_rate, kind, variant):
+        """
+        Synthesize a drum one-shot; noise is seeded by variant
+        """
+        noise_rng = np.random.default_rng(variant)
+        
+        if kind == 'kick':
+            t_kick = np.arange(int(0.2 * sample_rate)) / sample_rate
+            envelope = np.exp(-t_kick * 20)  # Quick decay
+            
+            # Low frequency sine wave with pitch bend
+            freq = 60 * np.exp(-t_kick * 10)
+            kick = np.sin(2 * np.pi * freq * t_kick) * envelope
+            return kick * 0.3
+        
+        if kind == 'snare':
+            t_snare = np.arange(int(0.15 * sample_rate)) / sample_rate
+            envelope = np.exp(-t_snare * 15)
+            
+            # White noise with tonal component
+            noise = noise_rng.normal(0, 1, len(t_snare))
+            tone = np.sin(2 * np.pi * 200 * t_snare)
+            snare = (noise * 0.7 + tone * 0.3) * envelope
+            return snare * 0.2
+        
+        if kind == 'hihat':
+            t_hihat = np.arange(int(0.05 * sample_rate)) / sample_rate
+            envelope = np.exp(-t_hihat * 50)
+            
+            # High frequency noise
+            noise = noise_rng.normal(0, 1, len(t_hihat))
+            hihat = self.sos(sample_rate, 'high', 8000, 4)
+            filtered_noise = signal.sosfilt(hihat, noise) * envelope
+            return filtered_noise * 0.1
+        
+        raise ValueError(f"Unknown drum kind: {kind}")
+
+class _FilterStage:
+    """
+    Streaming SOS filter; the filter state (zi) carries across blocks
+    
+    With mix=None the filtered signal replaces the input, otherwise it is
+    added on top of the dry signal scaled by mix.
+    """
+    
+    def __init__(self, sos, mix=None):
+        self.sos = sos
+        self.mix = mix
+        self.zi = np.zeros((sos.shape[0], 2), dtype=sos.dtype)
+    
+    def process(self, block):
+        filtered, self.zi = signal.sosfilt(self.sos, block, zi=self.zi)
+        if self.mix is None:
+            return filtered
+        return block + filtered * self.mix
+
+class _ReverbStage:
+    """
+    Single-tap delay reverb; the delay line carries across blocks
+    """
+    
+    def __init__(self, delay_samples, amount):
+        self.gain = amount * 0.3
+        self.delay_line = np.zeros(delay_samples, dtype=DTYPE)
+    
+    def process(self, block):
+        joined = np.concatenate((self.delay_line, block))
+        delayed = joined[:len(block)]
+        self.delay_line = joined[len(block):]
+        return block + delayed * self.gain
+
+class _CompressionStage:
+    """
+    Simple (stateless) hard-knee compressor
+    """
+    
+    def __init__(self, ratio, threshold=0.5):
+        self.ratio = ratio
+        self.threshold = threshold
+    
+    def process(self, block):
+        magnitude = np.abs(block)
+        over_threshold = magnitude > self.threshold
+        compressed = np.copy(block)
+        compressed[over_threshold] = np.sign(block[over_threshold]) * (
+            self.threshold + (magnitude[over_threshold] - self.threshold) / self.ratio
+        )
+        return compressed
+
+class _DistortionStage:
+    """
+    Subtle (stateless) tanh distortion
+    """
+    
+    def __init__(self, amount):
+        self.amount = amount
+    
+    def process(self, block):
+        return np.tanh(block * (1 + self.amount * 5)) / (1 + self.amount)
+
+class _PeakLimiter:
+    """
+    Single-pass normalizer for streaming renders
+    
+    The first block sets a make-up gain towards the ceiling (bounded by
+    max_gain); after that the gain only ever drops, instantly at block
+    boundaries, whenever a block would exceed the ceiling. Output never
+    clips and no lookahead beyond the current block is needed.
+    """
+    
+    def __init__(self, ceiling=0.8, max_gain=4.0):
+        self.ceiling = ceiling
+        self.max_gain = max_gain
+        self.gain = None
+    
+    def process(self, block):
+        peak = float(np.max(np.abs(block), initial=0.0))
+        if self.gain is None:
+            self.gain = min(self.ceiling / peak, self.max_gain) if peak > 0 else 1.0
+        elif peak * self.gain > self.ceiling:
+            self.gain = self.ceiling / peak
+        return block * self.gain
+
+class _StreamSink:
+    """
+    Append-only file-like target for libsndfile virtual IO
+    
+    Bytes are handed out with take() as soon as they are written. Seeks
+    are honoured so the encoder can query its position, but rewrites of
+    bytes that were already handed out (header fix-ups on close) are
+    dropped; stream formats such as FLAC do not need them.
+    """
+    
+    def __init__(self):
+        self.pending = bytearray()
+        self.position = 0
+        self.length = 0
+    
+    def write(self, data):
+        data = bytes(data)
+        if self.position == self.length:
+            self.pending += data
+            self.length += len(data)
+        self.position += len(data)
+        return len(data)
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self.position = offset
+        return self.position
+    
+    def tell(self):
+        return self.position
+    
+    def read(self, size=-1):
+        return b''
+    
+    def take(self):
+        data = bytes(self.pending)
+        self.pending.clear()
+        return data
+
+@dataclass(frozen=True)
+class RenderConfig:
+    """
+    Immutable description of a single render
+    
+    Everything a render needs is read from its config rather than from
+    the shared AudioGenerator, so one generator can serve concurrent
+    renders. Randomness comes from make_rng(): a fresh numpy Generator per
+    render, seeded from seed when one is given. sample_format (a key of
+    SAMPLE_FORMATS) only affects how the float32 render is encoded.
+    """
+    
+    mood: str
+    sentiment_score: float = 0.0
+    intensity: float = 0.5
+    duration: float = 40
+    sample_rate: int = 44100
+    seed: Optional[int] = None
+    sample_format: str = 'pcm16'
+    
+    @property
+    def length(self):
+        """
+        Clip length in samples
+        """
+        return int(self.sample_rate * self.duration)
+    
+    def make_rng(self):
+        """
+        New random Generator for this render
+        """
+        return np.random.default_rng(self.seed)
+    
+    @property
+    def subtype(self):
+        """
+        libsndfile subtype for sample_format
+        """
+        return SAMPLE_FORMATS[self.sample_format]
+
 class AudioGenerator:
     """
     Generate audio clips based on mood and sentiment analysis
+    
+    Generation is split in two: a compact score (note and hit events plus
+    the few distinct waveforms they use) is composed up front, then the
+    clip is rendered, filtered and written in fixed-size blocks. Peak
+    memory therefore does not grow with clip length.
+    
+    The generator itself is never mutated by a render; per-render settings
+    live in a RenderConfig, so a single instance is safe to share across
+    threads.
     """
     
     def __init__(self):
+        # Defaults for new RenderConfigs
         self.sample_rate = 44100
         self.duration = 40  # 40 seconds as requested
+        self.block_size = 32768  # Samples rendered per block (~0.75 s)
+        self.sample_format = 'pcm16'  # 16-bit PCM output by default
         self.output_dir = "generated_audio"
         os.makedirs(self.output_dir, exist_ok=True)
+        
+        # Seeded renders are deterministic and cached by content
+        self.sentiment_step = 0.05
+        self.intensity_step = 0.05
+        self.render_cache = RenderCache(
+            os.path.join(self.output_dir, "cache"),
+            max_bytes=512 * 1024 * 1024,
+        )
     
-    def generate_mood_audio(self, mood, sentiment_score=0.0, intensity=0.5):
+    def make_config(self, mood, sentiment_score=0.0, intensity=0.5, duration=None, seed=None,
+                    sample_format=None):
+        """
+        Build a RenderConfig using this generator's defaults
+        """
+        sample_format = sample_format or self.sample_format
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        
+        return RenderConfig(
+            mood=mood,
+            sentiment_score=float(sentiment_score),
+            intensity=float(intensity),
+            duration=self.duration if duration is None else duration,
+            sample_rate=self.sample_rate,
+            seed=None if seed is None else int(seed),
+            sample_format=sample_format,
+        )
+    
+    def generate_mood_audio(self, mood, sentiment_score=0.0, intensity=0.5, seed=None, duration=None,
+                            sample_format=None, audio_format='wav'):
         """
         Generate a 40-second audio clip based on mood and sentiment
         
@@ -42,52 +376,300 @@ class AudioGenerator:
             mood: Detected mood (happy, sad, energetic, etc.)
             sentiment_score: Sentiment polarity (-1 to 1)
             intensity: Emotion intensity (0 to 1)
+            seed: Optional integer seed. Seeded renders are deterministic;
+                sentiment and intensity are quantized and the clip is
+                served from the render cache if it was rendered before.
+            duration: Optional clip length in seconds (default 40)
+            sample_format: 'pcm16' (default), 'pcm24' or 'float32'
+            audio_format: Output encoder name ('wav', 'flac', 'ogg', 'opus'
+                or 'mp3'); the WAV master is kept for further renditions
             
         Returns:
-            str: Path to generated audio file
+            str: Path to generated audio file, always in output_dir; cached
+            renders are published there so links to them survive eviction
+        """
+        filepath = self.render(self.make_config(mood, sentiment_score, intensity, duration, seed, sample_format))
+        if audio_format != 'wav':
+            filepath = self.encode(filepath, audio_format)
+        if os.path.dirname(os.path.abspath(filepath)) == os.path.abspath(self.render_cache.directory):
+            filepath = self.render_cache.publish(filepath, self.output_dir)
+        return filepath
+    
+    def render(self, config):
+        """
+        Render a RenderConfig to a file and return its path
         """
-        # Generate base audio based on mood
-        audio = self._generate_base_audio(mood, sentiment_score, intensity)
+        if config.seed is not None and SOUNDFILE_AVAILABLE:
+            return self._render_cached(config)
         
-        # Apply mood-specific effects
-        audio = self._apply_mood_effects(audio, mood, intensity)
+        # Compose note and drum events based on mood
+        score = self._compose(config, config.make_rng())
         
-        # Apply sentiment-based modulation
-        audio = self._apply_sentiment_modulation(audio, sentiment_score)
+        # Render, apply effects, normalize and save block by block
+        filename = self._save_audio(score)
         
-        # Normalize and ensure proper length
-        audio = self._normalize_audio(audio)
+        return filename
+    
+    def encode(self, filepath, audio_format):
+        """
+        Rendition of a rendered WAV clip in another output format
         
-        # Save to file
-        filename = self._save_audio(audio, mood, sentiment_score)
+        Renditions sit next to their master as <name>.<extension> and are
+        encoded once, so seeded renders keep every rendition in the
+        render cache under the same key.
+        """
+        encoder = get_encoder(audio_format)
+        if encoder is None:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        if filepath.endswith(f".{encoder.extension}"):
+            return filepath
         
-        return filename
+        target = os.path.splitext(filepath)[0] + f".{encoder.extension}"
+        in_cache = os.path.dirname(os.path.abspath(target)) == os.path.abspath(self.render_cache.directory)
+        if os.path.exists(target):
+            if in_cache:
+                self.render_cache.touch(target)
+            return target
+        
+        transcode(filepath, target, encoder)
+        if in_cache:
+            self.render_cache.evict()
+        return target
     
-    def _generate_base_audio(self, mood, sentiment_score, intensity):
+    def _render_cached(self, config):
         """
-        Generate base audio waveform based on mood
+        Deterministic render through the content-addressed render cache
         """
-        t = np.linspace(0, self.duration, int(self.sample_rate * self.duration))
+        config = replace(
+            config,
+            sentiment_score=_quantize(config.sentiment_score, self.sentiment_step),
+            intensity=_quantize(config.intensity, self.intensity_step),
+        )
+        key = RenderCache.make_key(
+            ENGINE_VERSION, config.mood, config.sentiment_score, config.intensity,
+            config.duration, config.sample_rate, config.seed, config.sample_format,
+        )
         
-        # Mood-specific frequency and rhythm patterns
-        mood_params = self._get_mood_parameters(mood, intensity)
+        cached = self.render_cache.get(key, 'wav')
+        if cached is not None:
+            return cached
         
-        # Generate multiple layers
-        audio = np.zeros_like(t)
+        score = self._compose(config, config.make_rng())
+        temp_path = self.render_cache.temp_path('wav')
+        try:
+            self._save_audio(score, filepath=temp_path)
+            return self.render_cache.commit(temp_path, key, 'wav')
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def render_batch(self, specs, workers=None):
+        """
+        Render many clips in parallel worker processes
         
-        # Base melody layer
-        melody = self._generate_melody(t, mood_params)
-        audio += melody * 0.4
+        Args:
+            specs: Iterable of RenderConfigs or dicts of make_config arguments
+            workers: Number of worker processes (default: CPU count)
+            
+        Yields:
+            dict per clip as it finishes, in completion order, with the
+            spec's index, the config, the output filepath (or error) and the
+            render time in seconds. Invalid specs are reported first, with
+            config None and the validation error.
         
-        # Harmony layer
-        harmony = self._generate_harmony(t, mood_params)
-        audio += harmony * 0.3
+        Workers render with a copy of this generator, so its output_dir,
+        render cache and defaults apply in every process.
+        """
+        configs = []
+        for index, spec in enumerate(specs):
+            if isinstance(spec, RenderConfig):
+                configs.append((index, spec))
+                continue
+            try:
+                configs.append((index, self.make_config(**spec)))
+            except (TypeError, ValueError) as e:
+                yield {'index': index, 'config': None, 'filepath': None,
+                       'error': f"Invalid spec: {e}", 'seconds': 0.0}
+        if not configs:
+            return
         
-        # Rhythm layer
-        rhythm = self._generate_rhythm(t, mood_params)
-        audio += rhythm * 0.3
+        workers = min(workers or os.cpu_count() or 1, len(configs))
+        if workers == 1:
+            for index, config in configs:
+                yield _render_batch_item(index, config, generator=self)
+            return
         
-        return audio
+        sample_rates = sorted({config.sample_rate for _, config in configs})
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(self, sample_rates)) as pool:
+            futures = [pool.submit(_render_batch_item, index, config)
+                       for index, config in configs]
+            for future in as_completed(futures):
+                yield future.result()
+    
+    def stream_mood_audio(self, mood, sentiment_score=0.0, intensity=0.5, audio_format='wav', duration=None,
+                          sample_format=None):
+        """
+        Generate an audio clip as a stream of encoded chunks
+        
+        The header is produced before any audio is rendered and every
+        rendered block is encoded and yielded straight away, so the first
+        audio arrives after one block instead of the full render. A peak
+        limiter replaces two-pass normalization. The streamed bytes are
+        also written to disk for history; if the consumer stops early the
+        rest of the clip is still rendered into the file.
+        
+        Args:
+            mood: Detected mood (happy, sad, energetic, etc.)
+            sentiment_score: Sentiment polarity (-1 to 1)
+            intensity: Emotion intensity (0 to 1)
+            audio_format: 'wav' or 'flac'
+            duration: Optional clip length in seconds (default 40)
+            sample_format: 'pcm16' (default), 'pcm24' or 'float32' (WAV only)
+            
+        Returns:
+            tuple: (path to the persisted file, iterator of bytes chunks)
+        """
+        config = self.make_config(mood, sentiment_score, intensity, duration, sample_format=sample_format)
+        return self.stream(config, audio_format)
+    
+    def stream(self, config, audio_format='wav'):
+        """
+        Stream a RenderConfig; see stream_mood_audio
+        """
+        if audio_format not in ('wav', 'flac'):
+            raise ValueError(f"Unsupported stream format: {audio_format}")
+        if not SOUNDFILE_AVAILABLE and audio_format == 'flac':
+            raise RuntimeError("FLAC streaming requires the soundfile library")
+        if audio_format == 'flac' and config.sample_format == 'float32':
+            raise ValueError("FLAC does not support float32 samples")
+        
+        score = self._compose(config, config.make_rng())
+        filepath = self._output_path(config, audio_format)
+        effects = self._build_effect_chain(config) + [_PeakLimiter()]
+        blocks = self._render_blocks(score, effects)
+        
+        if audio_format == 'wav':
+            encoder = self._wav_chunks(config, blocks)
+        else:
+            encoder = self._flac_chunks(config, blocks)
+        
+        return filepath, self._tee_to_file(encoder, filepath)
+    
+    def _wav_chunks(self, config, blocks):
+        """
+        Encode blocks as a WAV stream with an exact header
+        
+        PCM formats use a plain 16-byte fmt chunk; float32 uses the
+        extended fmt chunk plus the fact chunk that non-PCM WAV requires.
+        """
+        width = _SAMPLE_WIDTHS[config.sample_format]
+        data_size = config.length * width
+        byte_rate = config.sample_rate * width
+        
+        if config.sample_format == 'float32':
+            yield struct.pack(
+                '<4sI4s4sIHHIIHHH4sII4sI',
+                b'RIFF', 50 + data_size, b'WAVE',
+                b'fmt ', 18, 3, 1, config.sample_rate, byte_rate, width, 32, 0,
+                b'fact', 4, config.length,
+                b'data', data_size,
+            )
+        else:
+            yield struct.pack(
+                '<4sI4s4sIHHIIHH4sI',
+                b'RIFF', 36 + data_size, b'WAVE',
+                b'fmt ', 16, 1, 1, config.sample_rate, byte_rate, width, width * 8,
+                b'data', data_size,
+            )
+        for block in blocks:
+            yield _encode_samples(block, config.sample_format)
+    
+    def _flac_chunks(self, config, blocks):
+        """
+        Encode blocks as a FLAC stream via libsndfile
+        
+        libsndfile only fills in STREAMINFO on close, which is too late for
+        a stream, so the total sample count is patched into the header as
+        it goes out. Frame sizes and the MD5 stay "unknown", as the FLAC
+        format allows.
+        """
+        sink = _StreamSink()
+        header_sent = False
+        with sf.SoundFile(sink, 'w', samplerate=config.sample_rate, channels=1,
+                          format='FLAC', subtype=config.subtype) as encoder:
+            for block in blocks:
+                encoder.write(block)
+                chunk = sink.take()
+                if chunk and not header_sent:
+                    chunk = _flac_set_total_samples(chunk, config.length)
+                    header_sent = True
+                if chunk:
+                    yield chunk
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    
+    def _tee_to_file(self, chunks, filepath):
+        """
+        Yield chunks while writing them to filepath
+        
+        The file is always completed, even if the consumer closes the
+        stream early (e.g. the client disconnects).
+        """
+        with open(filepath, 'wb') as out:
+            try:
+                for chunk in chunks:
+                    out.write(chunk)
+                    yield chunk
+            finally:
+                for chunk in chunks:
+                    out.write(chunk)
+    
+    def _compose(self, config, rng):
+        """
+        Compose the score (melody, harmony and rhythm events) for a config
+        
+        Every random choice is drawn from rng (a numpy Generator), so a
+        seeded generator always yields the same score.
+        """
+        # Mood-specific frequency and rhythm patterns
+        mood_params = self._get_mood_parameters(config.mood, config.intensity)
+        
+        return {
+            'config': config,
+            'length': config.length,
+            'melody': self._generate_melody(mood_params, config, rng),
+            'harmony': self._generate_harmony(mood_params, config, rng),
+            'rhythm': self._generate_rhythm(mood_params, config, rng),
+        }
+    
+    def _render_block(self, score, block_start, block_end):
+        """
+        Mix all score layers for samples [block_start, block_end)
+        """
+        block = np.zeros(block_end - block_start, dtype=DTYPE)
+        self._mix_notes(block, block_start, score['melody'])
+        self._mix_notes(block, block_start, score['harmony'])
+        self._schedule_hits(block, score['rhythm'], block_start, gain=0.3)
+        return block
+    
+    def _render_blocks(self, score, effects, gain=1.0):
+        """
+        Yield rendered, effect-processed blocks covering the whole score
+        
+        effects is a fresh stage list from _build_effect_chain; stage state
+        (filter zi, delay lines) carries from one block to the next.
+        """
+        for block_start in range(0, score['length'], self.block_size):
+            block_end = min(block_start + self.block_size, score['length'])
+            block = self._render_block(score, block_start, block_end)
+            for stage in effects:
+                block = stage.process(block)
+            if gain != 1.0:
+                block *= gain
+            yield block
     
     def _get_mood_parameters(self, mood, intensity):
         """
@@ -147,7 +729,7 @@ class AudioGenerator:
         
         return params.get(mood, params['calm'])
     
-    def _generate_melody(self, t, params):
+    def _generate_melody(self, params, config, rng):
         """
         Generate melodic line based on mood parameters
         """
@@ -156,26 +738,17 @@ class AudioGenerator:
         tempo = params['tempo']
         
         # Create melody with scale notes
-        melody = np.zeros_like(t)
         note_duration = 60 / tempo  # Duration of each note in seconds
+        n_notes = int(config.duration / note_duration)
         
-        for i in range(int(self.duration / note_duration)):
-            start_time = i * note_duration
-            end_time = min((i + 1) * note_duration, self.duration)
-            
-            # Select random note from scale
-            scale_degree = random.choice(scale)
-            freq = base_freq * (2 ** (scale_degree / 12))
-            
-            # Generate note
-            note_mask = (t >= start_time) & (t < end_time)
-            if np.any(note_mask):  # Only process if there are samples in this time range
-                envelope = self._generate_envelope(t[note_mask], note_duration)
-                melody[note_mask] = np.sin(2 * np.pi * freq * (t[note_mask] - start_time)) * envelope
+        # Select random notes from scale
+        degrees = rng.choice(scale, size=n_notes)
+        freqs = base_freq * (2 ** (degrees / 12))
         
-        return melody
+        starts, ends = self._note_bounds(n_notes, note_duration, config)
+        return self._prepare_notes(starts, ends, freqs[:, None], note_duration, config, gain=0.4)
     
-    def _generate_harmony(self, t, params):
+    def _generate_harmony(self, params, config, rng):
         """
         Generate harmonic accompaniment
         """
@@ -183,62 +756,143 @@ class AudioGenerator:
         scale = params['scale']
         
         # Generate chord progression
-        harmony = np.zeros_like(t)
         chord_duration = 4.0  # 4 seconds per chord
+        n_chords = int(config.duration / chord_duration)
         
-        for i in range(int(self.duration / chord_duration)):
-            start_time = i * chord_duration
-            end_time = min((i + 1) * chord_duration, self.duration)
-            
+        chords = []
+        for _ in range(n_chords):
             # Generate triad chord
-            root_idx = random.randint(0, len(scale) - 1)
+            root_idx = int(rng.integers(len(scale)))
             third_idx = (root_idx + 2) % len(scale)
             fifth_idx = (root_idx + 4) % len(scale)
-            
-            chord_mask = (t >= start_time) & (t < end_time)
-            if np.any(chord_mask):  # Only process if there are samples in this time range
-                envelope = self._generate_envelope(t[chord_mask], chord_duration) * 0.5
-                
-                # Add chord tones
-                for degree in [scale[root_idx], scale[third_idx], scale[fifth_idx]]:
-                    freq = base_freq * (2 ** (degree / 12))
-                    harmony[chord_mask] += np.sin(2 * np.pi * freq * (t[chord_mask] - start_time)) * envelope / 3
+            chords.append([scale[root_idx], scale[third_idx], scale[fifth_idx]])
+        
+        freqs = base_freq * (2 ** (np.array(chords, dtype=float).reshape(n_chords, 3) / 12))
+        
+        starts, ends = self._note_bounds(n_chords, chord_duration, config)
+        return self._prepare_notes(starts, ends, freqs, chord_duration, config, gain=0.5 * 0.3)
+    
+    def _note_bounds(self, n_notes, note_duration, config):
+        """
+        Start and end sample indices for n back-to-back notes
+        """
+        edges = (np.arange(n_notes + 1) * note_duration * config.sample_rate).astype(int)
+        edges = np.minimum(edges, config.length)
+        return edges[:-1], edges[1:]
+    
+    def _prepare_notes(self, starts, ends, freqs, note_duration, config, gain=1.0):
+        """
+        Build a note layer: sample bounds plus one waveform per voicing
+        
+        freqs has one row per note and one column per simultaneous tone;
+        tones are averaged and shaped by the ADSR envelope for
+        note_duration. Each distinct tone and each distinct row is
+        synthesized once (in float64, for accurate phase) and stored as
+        float32 for mixing.
+        """
+        t_note, envelope = _note_envelope(config.sample_rate, note_duration)
+        phase = 2 * np.pi * t_note
+        
+        tones, tone_idx = np.unique(freqs, return_inverse=True)
+        partials = np.sin(tones[:, None] * phase[None, :])
         
-        return harmony
+        voicings, which = np.unique(tone_idx.reshape(freqs.shape), axis=0, return_inverse=True)
+        rendered = partials[voicings[:, 0]]
+        for column in voicings[:, 1:].T:
+            rendered += partials[column]
+        rendered *= envelope * (gain / freqs.shape[1])
+        
+        return {
+            'starts': starts,
+            'ends': np.minimum(ends, starts + len(t_note)),
+            'which': which.ravel(),
+            'rendered': rendered.astype(DTYPE),
+        }
     
-    def _generate_rhythm(self, t, params):
+    def _mix_notes(self, buffer, block_start, layer):
+        """
+        Mix the notes of a layer that overlap buffer into it in place
+        """
+        block_end = block_start + len(buffer)
+        starts, ends = layer['starts'], layer['ends']
+        
+        first = np.searchsorted(ends, block_start, side='right')
+        last = np.searchsorted(starts, block_end, side='left')
+        for i in range(first, last):
+            lo = max(starts[i], block_start)
+            hi = min(ends[i], block_end)
+            if hi > lo:
+                buffer[lo - block_start:hi - block_start] += (
+                    layer['rendered'][layer['which'][i], lo - starts[i]:hi - starts[i]]
+                )
+        return buffer
+    
+    def _generate_rhythm(self, params, config, rng):
         """
         Generate rhythmic percussion elements
+        
+        Every hit is a short one-shot mixed in at its sample offset, so the
+        cost is proportional to the total number of hit samples rather
+        than beats x clip length.
         """
         tempo = params['tempo']
         complexity = params['rhythm_complexity']
         
-        rhythm = np.zeros_like(t)
         beat_duration = 60 / tempo
         
-        for i in range(int(self.duration / beat_duration)):
-            start_time = i * beat_duration
+        # The kick has no noise component, so a single one-shot serves every beat
+        kick = self._generate_kick(beat_duration, config)
+        
+        offsets = []
+        one_shots = []
+        for i in range(int(config.duration / beat_duration)):
+            offset = int(i * beat_duration * config.sample_rate)
+            if offset >= config.length:
+                break
             
             # Add kick drum on beats 1 and 3
             if i % 4 in [0, 2]:
-                kick = self._generate_kick(t, start_time, beat_duration)
-                rhythm += kick
+                offsets.append(offset)
+                one_shots.append(kick)
             
             # Add snare on beats 2 and 4
             if i % 4 in [1, 3]:
-                snare = self._generate_snare(t, start_time, beat_duration)
-                rhythm += snare
+                offsets.append(offset)
+                one_shots.append(self._generate_snare(beat_duration, config, rng))
             
             # Add hi-hat based on complexity
-            if random.random() < complexity:
-                hihat = self._generate_hihat(t, start_time, beat_duration)
-                rhythm += hihat
+            if rng.random() < complexity:
+                offsets.append(offset)
+                one_shots.append(self._generate_hihat(beat_duration, config, rng))
         
-        return rhythm
+        return {
+            'offsets': np.array(offsets, dtype=np.int64),
+            'one_shots': one_shots,
+            'max_length': max((len(one_shot) for one_shot in one_shots), default=0),
+        }
     
-    def _generate_envelope(self, t, duration):
+    def _schedule_hits(self, buffer, hits, block_start=0, gain=1.0):
         """
-        Generate ADSR envelope for notes
+        Mix the hits that overlap buffer into it in place
+        """
+        block_end = block_start + len(buffer)
+        offsets = hits['offsets']
+        
+        first = np.searchsorted(offsets, block_start - hits['max_length'], side='right')
+        last = np.searchsorted(offsets, block_end, side='left')
+        for i in range(first, last):
+            offset = offsets[i]
+            one_shot = hits['one_shots'][i]
+            lo = max(offset, block_start)
+            hi = min(offset + len(one_shot), block_end)
+            if hi > lo:
+                buffer[lo - block_start:hi - block_start] += one_shot[lo - offset:hi - offset] * gain
+        return buffer
+    
+    @staticmethod
+    def _generate_envelope(t, duration):
+        """
+        Generate ADSR envelope for notes (t is note-local time in seconds)
         """
         attack = min(0.1, duration * 0.1)
         decay = min(0.2, duration * 0.2)
@@ -262,179 +916,143 @@ class AudioGenerator:
         
         return envelope
     
-    def _generate_kick(self, t, start_time, duration):
+    def _generate_kick(self, duration, config):
         """
-        Generate kick drum sound
+        Kick drum one-shot from the shared sample bank
         """
-        kick_duration = min(0.2, duration)
-        mask = (t >= start_time) & (t < start_time + kick_duration)
-        
-        if not np.any(mask):
-            return np.zeros_like(t)
-        
-        t_kick = t[mask] - start_time
-        envelope = np.exp(-t_kick * 20)  # Quick decay
-        
-        # Low frequency sine wave with pitch bend
-        freq = 60 * np.exp(-t_kick * 10)
-        kick = np.sin(2 * np.pi * freq * t_kick) * envelope
-        
-        result = np.zeros_like(t)
-        result[mask] = kick
-        return result * 0.3
+        return get_sample_bank().drum(config.sample_rate, 'kick')[:int(duration * config.sample_rate)]
     
-    def _generate_snare(self, t, start_time, duration):
+    def _generate_snare(self, duration, config, rng):
         """
-        Generate snare drum sound
+        Snare drum one-shot from the shared sample bank (random noise variant)
         """
-        snare_duration = min(0.15, duration)
-        mask = (t >= start_time) & (t < start_time + snare_duration)
-        
-        if not np.any(mask):
-            return np.zeros_like(t)
-        
-        t_snare = t[mask] - start_time
-        envelope = np.exp(-t_snare * 15)
-        
-        # White noise with tonal component
-        noise = np.random.normal(0, 1, len(t_snare))
-        tone = np.sin(2 * np.pi * 200 * t_snare)
-        snare = (noise * 0.7 + tone * 0.3) * envelope
-        
-        result = np.zeros_like(t)
-        result[mask] = snare
-        return result * 0.2
+        variant = int(rng.integers(SampleBank.NOISE_VARIANTS))
+        return get_sample_bank().drum(config.sample_rate, 'snare', variant)[:int(duration * config.sample_rate)]
     
-    def _generate_hihat(self, t, start_time, duration):
+    def _generate_hihat(self, duration, config, rng):
         """
-        Generate hi-hat sound
+        Hi-hat one-shot from the shared sample bank (random noise variant)
         """
-        hihat_duration = min(0.05, duration)
-        mask = (t >= start_time) & (t < start_time + hihat_duration)
-        
-        if not np.any(mask):
-            return np.zeros_like(t)
-        
-        t_hihat = t[mask] - start_time
-        envelope = np.exp(-t_hihat * 50)
-        
-        # High frequency noise
-        noise = np.random.normal(0, 1, len(t_hihat))
-        hihat = signal.butter(4, 8000, 'high', fs=self.sample_rate, output='sos')
-        filtered_noise = signal.sosfilt(hihat, noise) * envelope
-        
-        result = np.zeros_like(t)
-        result[mask] = filtered_noise
-        return result * 0.1
+        variant = int(rng.integers(SampleBank.NOISE_VARIANTS))
+        return get_sample_bank().drum(config.sample_rate, 'hihat', variant)[:int(duration * config.sample_rate)]
+    
+    def _build_effect_chain(self, config):
+        """
+        Fresh list of streaming effect stages for a render pass
+        """
+        return self._mood_effects(config) + self._sentiment_effects(config)
     
-    def _apply_mood_effects(self, audio, mood, intensity):
+    def _mood_effects(self, config):
         """
-        Apply mood-specific audio effects
+        Mood-specific audio effect stages
         """
+        mood, intensity, sample_rate = config.mood, config.intensity, config.sample_rate
+        
         if mood == 'happy':
             # Add brightness and reverb
-            audio = self._add_reverb(audio, 0.3)
-            audio = self._add_brightness(audio, intensity * 0.5)
+            return [self._add_reverb(0.3, sample_rate), self._add_brightness(intensity * 0.5, sample_rate)]
         
         elif mood == 'sad':
             # Add low-pass filter and reverb
-            audio = self._apply_lowpass(audio, 2000)
-            audio = self._add_reverb(audio, 0.5)
+            return [self._apply_lowpass(2000, sample_rate), self._add_reverb(0.5, sample_rate)]
         
         elif mood == 'energetic':
             # Add compression and distortion
-            audio = self._add_compression(audio, 0.7)
-            audio = self._add_distortion(audio, intensity * 0.3)
+            return [_CompressionStage(0.7), _DistortionStage(intensity * 0.3)]
         
         elif mood == 'calm':
             # Add gentle reverb and low-pass
-            audio = self._apply_lowpass(audio, 4000)
-            audio = self._add_reverb(audio, 0.4)
+            return [self._apply_lowpass(4000, sample_rate), self._add_reverb(0.4, sample_rate)]
         
-        return audio
+        return []
     
-    def _apply_sentiment_modulation(self, audio, sentiment_score):
+    def _sentiment_effects(self, config):
         """
-        Modulate audio based on sentiment score
+        Effect stages that modulate audio based on sentiment score
         """
+        sentiment_score = config.sentiment_score
+        
         if sentiment_score > 0:
             # Positive sentiment: increase brightness and add subtle chorus
-            audio = self._add_brightness(audio, sentiment_score * 0.3)
+            return [self._add_brightness(sentiment_score * 0.3, config.sample_rate)]
         elif sentiment_score < 0:
             # Negative sentiment: darken and add subtle distortion
-            audio = self._apply_lowpass(audio, 3000 + sentiment_score * 1000)
+            return [self._apply_lowpass(3000 + sentiment_score * 1000, config.sample_rate)]
         
-        return audio
+        return []
     
-    def _add_reverb(self, audio, amount):
+    def _add_reverb(self, amount, sample_rate):
         """
-        Add simple reverb effect
+        Simple reverb stage (50ms delay)
         """
-        delay_samples = int(0.05 * self.sample_rate)  # 50ms delay
-        delayed = np.pad(audio, (delay_samples, 0), mode='constant')[:-delay_samples]
-        return audio + delayed * amount * 0.3
+        return _ReverbStage(int(0.05 * sample_rate), amount)
     
-    def _add_brightness(self, audio, amount):
+    def _add_brightness(self, amount, sample_rate):
         """
-        Add brightness using high-frequency emphasis
+        Brightness stage using high-frequency emphasis
         """
-        sos = signal.butter(2, 2000, 'high', fs=self.sample_rate, output='sos')
-        bright = signal.sosfilt(sos, audio)
-        return audio + bright * amount
+        sos = get_sample_bank().sos(sample_rate, 'high', 2000, 2)
+        return _FilterStage(sos, mix=amount)
     
-    def _apply_lowpass(self, audio, cutoff):
+    def _apply_lowpass(self, cutoff, sample_rate):
         """
-        Apply low-pass filter
+        Low-pass filter stage
         """
-        sos = signal.butter(4, cutoff, 'low', fs=self.sample_rate, output='sos')
-        return signal.sosfilt(sos, audio)
+        sos = get_sample_bank().sos(sample_rate, 'low', cutoff, 4)
+        return _FilterStage(sos)
     
-    def _add_compression(self, audio, ratio):
+    def _measure_peak(self, score):
         """
-        Simple compression effect
+        First pass of two-pass normalization: peak of the processed clip
         """
-        threshold = 0.5
-        compressed = np.copy(audio)
-        over_threshold = np.abs(audio) > threshold
-        compressed[over_threshold] = np.sign(audio[over_threshold]) * (
-            threshold + (np.abs(audio[over_threshold]) - threshold) / ratio
-        )
-        return compressed
+        effects = self._build_effect_chain(score['config'])
+        peak = 0.0
+        for block in self._render_blocks(score, effects):
+            peak = max(peak, float(np.max(np.abs(block), initial=0.0)))
+        return peak
     
-    def _add_distortion(self, audio, amount):
+    def _output_path(self, config, extension):
         """
-        Add subtle distortion
+        Path for a new output file in output_dir
         """
-        return np.tanh(audio * (1 + amount * 5)) / (1 + amount)
-    
-    def _normalize_audio(self, audio):
-        """
-        Normalize audio to prevent clipping
-        """
-        max_val = np.max(np.abs(audio))
-        if max_val > 0:
-            audio = audio / max_val * 0.8  # Leave some headroom
-        return audio
+        mood, sentiment_score = config.mood, config.sentiment_score
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        token = uuid.uuid4().hex[:8]  # Keeps same-second renders apart
+        filename = f"{mood}_{sentiment_score:.2f}_{timestamp}_{token}.{extension}"
+        return os.path.join(self.output_dir, filename)
     
-    def _save_audio(self, audio, mood, sentiment_score):
+    def _save_audio(self, score, filepath=None):
         """
-        Save audio to file
+        Render the score to file block by block
+        
+        The clip is rendered twice: once to measure its peak and once,
+        scaled to leave some headroom, into incremental SoundFile writes.
+        Rendering is deterministic for a given score, so both passes see
+        identical samples.
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{mood}_{sentiment_score:.2f}_{timestamp}.wav"
-        filepath = os.path.join(self.output_dir, filename)
+        config = score['config']
+        if filepath is None:
+            filepath = self._output_path(config, 'wav')
         
         if SOUNDFILE_AVAILABLE and sf is not None:
+            # Normalize to prevent clipping
+            peak = self._measure_peak(score)
+            gain = 0.8 / peak if peak > 0 else 1.0  # Leave some headroom
+            
             # Save audio as WAV file
-            sf.write(filepath, audio, self.sample_rate)
+            effects = self._build_effect_chain(config)
+            with sf.SoundFile(filepath, 'w', samplerate=config.sample_rate, channels=1,
+                              format='WAV', subtype=config.subtype) as out:
+                for block in self._render_blocks(score, effects, gain):
+                    out.write(block)
             return filepath
         else:
             # Fallback: save as text file with instructions
             txt_filepath = filepath.replace('.wav', '.txt')
             with open(txt_filepath, 'w') as f:
-                f.write(f"Audio generated for mood: {mood}, sentiment: {sentiment_score:.2f}\n")
-                f.write(f"Duration: {self.duration} seconds\n")
-                f.write(f"Sample rate: {self.sample_rate} Hz\n")
+                f.write(f"Audio generated for mood: {config.mood}, sentiment: {config.sentiment_score:.2f}\n")
+                f.write(f"Duration: {config.duration} seconds\n")
+                f.write(f"Sample rate: {config.sample_rate} Hz\n")
                 f.write("\nNote: soundfile library not available.\n")
                 f.write("Install with: pip install soundfile\n")
             return txt_filepath
@@ -443,23 +1061,109 @@ class AudioGenerator:
         """
         Generate a shorter preview (10 seconds) for quick testing
         """
-        original_duration = self.duration
-        self.duration = duration
-        
-        try:
-            filepath = self.generate_mood_audio(mood, sentiment_score, intensity)
-            return filepath
-        finally:
-            self.duration = original_duration
+        return self.generate_mood_audio(mood, sentiment_score, intensity, duration=duration)
+
+def _quantize(value, step):
+    """
+    Round value to the nearest multiple of step (stable for hashing)
+    """
+    return round(round(float(value) / step) * step, 6)
+
+# Bytes per sample for the raw WAV encoder
+_SAMPLE_WIDTHS = {'pcm16': 2, 'pcm24': 3, 'float32': 4}
+
+def _encode_samples(block, sample_format):
+    """
+    Little-endian WAV sample bytes for a float block in [-1, 1]
+    """
+    if sample_format == 'float32':
+        return block.astype('<f4').tobytes()
+    
+    block = np.clip(block, -1.0, 1.0)
+    if sample_format == 'pcm16':
+        return (block * 32767).astype('<i2').tobytes()
+    
+    # 24-bit: take the low three bytes of each little-endian int32
+    samples = (block.astype(np.float64) * 8388607).astype('<i4')
+    return samples.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+def _flac_set_total_samples(header, total_samples):
+    """
+    Write total_samples into the STREAMINFO block at the start of a FLAC stream
+    """
+    header = bytearray(header)
+    if header[:4] != b'fLaC' or header[4] & 0x7F != 0 or len(header) < 26:
+        return bytes(header)
+    # STREAMINFO starts at byte 8; the 36-bit sample count spans bytes 21-25
+    header[21] = (header[21] & 0xF0) | ((total_samples >> 32) & 0x0F)
+    header[22:26] = (total_samples & 0xFFFFFFFF).to_bytes(4, 'big')
+    return bytes(header)
 
-# Global audio generator instance
+def _note_envelope(sample_rate, duration):
+    """
+    Note-local time axis and ADSR envelope for a note of the given duration
+    
+    Built once per note layer per render, which is cheap next to the
+    synthesis itself; durations follow the tempo, so caching them rarely
+    hit and only held memory. The axis is one sample longer than the note
+    so that rounded note boundaries never run past the end.
+    """
+    t = np.arange(int(np.ceil(duration * sample_rate)) + 1) / sample_rate
+    envelope = np.maximum(AudioGenerator._generate_envelope(t, duration), 0)
+    return t, envelope
+
+# Copy of the submitting generator in a render_batch worker process
+_batch_generator = None
+
+def _init_batch_worker(generator, sample_rates):
+    """
+    ProcessPoolExecutor initializer: adopt the submitting generator's
+    settings and warm the worker's sample bank
+    """
+    global _batch_generator
+    _batch_generator = generator
+    bank = get_sample_bank()
+    for sample_rate in sample_rates:
+        bank.warm(sample_rate)
+
+def _render_batch_item(index, config, generator=None):
+    """
+    Render one batch entry, capturing its timing and any error
+    """
+    generator = generator or _batch_generator or get_audio_generator()
+    result = {'index': index, 'config': config, 'filepath': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        result['filepath'] = generator.render(config)
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+# Global sample bank and audio generator instances
+_sample_bank = None
 _audio_generator = None
 
+_singleton_lock = threading.Lock()
+
+def get_sample_bank():
+    """
+    Get or create the process-wide sample bank (singleton)
+    """
+    global _sample_bank
+    if _sample_bank is None:
+        with _singleton_lock:
+            if _sample_bank is None:
+                _sample_bank = SampleBank()
+    return _sample_bank
+
 def get_audio_generator():
     """
     Get or create audio generator instance (singleton)
     """
     global _audio_generator
     if _audio_generator is None:
-        _audio_generator = AudioGenerator()
+        with _singleton_lock:
+            if _audio_generator is None:
+                _audio_generator = AudioGenerator()
     return _audio_generator
\ No newline at end of file
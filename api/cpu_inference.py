@@ -0,0 +1,99 @@
+"""
+CPU Inference Tuning
+Per-process torch thread limits and optional int8 dynamic quantization of Linear layers
+"""
+
+import contextlib
+import os
+import threading
+
+from .lazy_imports import module_available
+
+# torch is imported by the functions that use it: model_version() checks
+# quantization_enabled() on every cache lookup, including in thin clients
+# that send inference to the model server and never need torch
+TORCH_AVAILABLE = module_available("torch")
+
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+
+def quantization_enabled():
+    """
+    Whether models are quantized on load (MODEL_QUANTIZE=1)
+    """
+    return os.getenv("MODEL_QUANTIZE", "0").lower() in ("1", "true", "yes") and TORCH_AVAILABLE
+
+
+def thread_counts():
+    """
+    (intra-op, inter-op) thread counts for this process
+
+    TORCH_NUM_THREADS and TORCH_INTEROP_THREADS win; otherwise the cores
+    are split between the WEB_CONCURRENCY gunicorn workers, so N workers
+    each running a full-width matmul do not oversubscribe the machine.
+    """
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    intra = int(os.getenv("TORCH_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // workers)
+    inter = int(os.getenv("TORCH_INTEROP_THREADS", "0")) or 1
+    return intra, inter
+
+
+def configure_threads():
+    """
+    Apply thread_counts() once per process
+
+    Called when the first model loads, which is after gunicorn forks its
+    workers, so each worker gets its own limits.
+    """
+    global _threads_configured
+    if not TORCH_AVAILABLE or _threads_configured:
+        return
+    with _threads_lock:
+        if _threads_configured:
+            return
+        import torch
+
+        intra, inter = thread_counts()
+        torch.set_num_threads(intra)
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            # Only settable before the first parallel op in the process
+            pass
+        _threads_configured = True
+
+
+def quantize_model(model):
+    """
+    int8 dynamic quantization of the model's Linear layers
+
+    Weights are stored as int8 and activations quantized on the fly, so
+    the transformer matmuls run through the int8 kernels; embeddings,
+    layer norms and convolutions stay fp32.
+    """
+    import torch
+
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def optimize_pipeline(pipe):
+    """
+    Quantize a transformers pipeline's model in place when enabled
+    """
+    if quantization_enabled() and hasattr(pipe, "model"):
+        pipe.model = quantize_model(pipe.model)
+    return pipe
+
+
+def inference_context():
+    """
+    torch.inference_mode() (no autograd bookkeeping at all), or a no-op
+    without torch
+    """
+    if TORCH_AVAILABLE:
+        import torch
+
+        return torch.inference_mode()
+    return contextlib.nullcontext()
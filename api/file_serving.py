@@ -0,0 +1,203 @@
+"""
+Generated File Serving
+Conditional GET, byte ranges, long-lived caching and proxy offload for generated media
+"""
+
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework.negotiation import BaseContentNegotiation
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_serving_settings():
+    """
+    File serving options, overridable from Django settings
+    """
+    return {
+        'cache_control': getattr(settings, 'GENERATED_MEDIA_CACHE_CONTROL',
+                                 'public, max-age=31536000, immutable'),
+        # None, 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx)
+        'sendfile_mode': getattr(settings, 'GENERATED_MEDIA_SENDFILE', None),
+        # nginx internal location that maps onto the working directory
+        'accel_prefix': getattr(settings, 'GENERATED_MEDIA_ACCEL_PREFIX', '/protected/'),
+        'chunk_size': 64 * 1024,
+    }
+
+
+@lru_cache(maxsize=4096)
+def _content_etag(filepath, mtime_ns, size):
+    """
+    Strong ETag from the file's content hash
+
+    Keyed by mtime and size so a rewritten file is hashed again; generated
+    media is immutable, so each file is normally hashed once per process.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return quote_etag(digest.hexdigest()[:32])
+
+
+def file_etag(filepath, stat=None):
+    """
+    Strong, content-derived ETag for filepath
+    """
+    stat = stat or os.stat(filepath)
+    return _content_etag(os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+
+def _not_modified(request, etag, mtime):
+    """
+    Evaluate If-None-Match, falling back to If-Modified-Since
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = parse_etags(if_none_match)
+        # If-None-Match uses weak comparison
+        return '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _range_applies(request, etag, mtime):
+    """
+    If-Range: only honour Range when the client's validator still matches
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag  # Strong comparison
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive for a single byte range, 'unsatisfiable', or
+    None when the header should be ignored (absent, malformed, multi-range)
+    """
+    match = RANGE_RE.match((header or "").replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _iter_range(filepath, start, end, chunk_size):
+    """
+    Yield bytes start..end (inclusive) of filepath
+    """
+    remaining = end - start + 1
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Always pick the view's first renderer, whatever the Accept header says
+
+    File views choose the representation themselves; DRF's default
+    negotiation would answer 406 to e.g. Accept: audio/ogg, since no
+    renderer produces audio.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def file_view(func):
+    """
+    Mark a function view as serving files (apply below @api_view)
+    """
+    func.content_negotiation_class = IgnoreClientContentNegotiation
+    return func
+
+
+def serve_generated_file(request, filepath, content_type):
+    """
+    Serve an immutable generated file
+
+    Sends a strong content-hash ETag, Last-Modified and a long
+    Cache-Control, answers matching conditional requests with 304 and
+    single byte ranges with 206 (416 when unsatisfiable). With
+    GENERATED_MEDIA_SENDFILE set, the body is handed to the front proxy
+    via X-Sendfile or X-Accel-Redirect; the proxy then serves ranges.
+    """
+    options = get_serving_settings()
+    stat = os.stat(filepath)
+    etag = file_etag(filepath, stat)
+
+    def with_validators(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = options['cache_control']
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return with_validators(HttpResponse(status=304))
+
+    if options['sendfile_mode'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.abspath(filepath)
+        return with_validators(response)
+
+    if options['sendfile_mode'] == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(filepath).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = options['accel_prefix'].rstrip('/') + '/' + relative
+        return with_validators(response)
+
+    byte_range = None
+    if request.method == 'GET' and _range_applies(request, etag, stat.st_mtime):
+        byte_range = _parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{stat.st_size}"
+        return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_range(filepath, start, end, options['chunk_size']),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        return with_validators(response)
+
+    response = FileResponse(open(filepath, 'rb'), as_attachment=False, content_type=content_type)
+    return with_validators(response)
@@ -0,0 +1,248 @@
+"""
+Background Render Jobs
+Database-backed queue that moves audio and MIDI renders out of the web workers
+"""
+
+import os
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import MusicHistory, RenderJob
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobRejected(Exception):
+    """
+    Raised when a job cannot be queued (queue full or per-user limit hit)
+    """
+
+
+def get_job_settings():
+    """
+    Queue limits, overridable from Django settings
+    """
+    return {
+        'max_queue_depth': getattr(settings, 'RENDER_JOB_MAX_QUEUE_DEPTH', 100),
+        'max_active_per_user': getattr(settings, 'RENDER_JOB_MAX_ACTIVE_PER_USER', 2),
+        'stale_after_seconds': getattr(settings, 'RENDER_JOB_STALE_AFTER_SECONDS', 600),
+    }
+
+
+def enqueue_job(user, kind, params):
+    """
+    Queue a render job for user
+
+    Raises JobRejected when the queue is at capacity or the user already
+    has the maximum number of queued or running jobs. The checks and the
+    insert run in one transaction, with the user's row locked where the
+    database supports it, so concurrent requests cannot both pass the
+    per-user limit.
+    """
+    limits = get_job_settings()
+
+    with transaction.atomic():
+        type(user)._default_manager.select_for_update().get(pk=user.pk)
+
+        if RenderJob.objects.filter(status='queued').count() >= limits['max_queue_depth']:
+            raise JobRejected('Render queue is full, please retry shortly')
+
+        active = RenderJob.objects.filter(user=user, status__in=ACTIVE_STATUSES).count()
+        if active >= limits['max_active_per_user']:
+            raise JobRejected(f"You already have {active} renders in progress")
+
+        return RenderJob.objects.create(user=user, kind=kind, params=params)
+
+
+def job_status(job):
+    """
+    JSON-serializable status payload for a job
+    """
+    data = {
+        'job_id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == 'done':
+        data['result'] = job.result
+    elif job.status == 'failed':
+        data['error'] = job.error
+    elif job.status == 'queued':
+        data['queue_position'] = RenderJob.objects.filter(status='queued', pk__lt=job.pk).count() + 1
+    return data
+
+
+def record_audio_history(user, mood, title, audio_filepath):
+    """
+    Save generation info for an audio clip in history
+    """
+    song_title = title if title else f"{mood.title()} Audio Clip"
+    MusicHistory.objects.create(
+        user=user,
+        mood=mood,
+        genre="Generated Audio",
+        language="",
+        spotify_song_url=f"/api/audio/{os.path.basename(audio_filepath)}",
+        song_name=song_title,
+        artist_name="NexGenMusic AI"
+    )
+
+
+def render_audio(user, params):
+    """
+    Render an audio clip, record it in history and return the response data
+
+    Used both by the synchronous endpoint and by the job worker.
+    """
+    from .audio_generator import get_audio_generator
+
+    mood = params['mood']
+    audio_generator = get_audio_generator()
+    audio_filepath = audio_generator.generate_mood_audio(
+        mood, params.get('sentiment_score', 0.0), params.get('intensity', 0.5),
+        seed=params.get('seed'), sample_format=params.get('sample_format'),
+        audio_format=params.get('audio_format') or 'wav'
+    )
+
+    record_audio_history(user, mood, params.get('title'), audio_filepath)
+
+    response_data = {
+        'audio_url': f"/api/audio/{os.path.basename(audio_filepath)}",
+        'mood': mood,
+        'intensity': params.get('intensity', 0.5),
+        'sentiment_score': params.get('sentiment_score', 0.0),
+        'duration': 40,
+        'sample_format': params.get('sample_format') or 'pcm16',
+        'format': params.get('audio_format') or 'wav',
+        'filename': os.path.basename(audio_filepath)
+    }
+
+    if params.get('seed') is not None:
+        response_data['seed'] = params['seed']
+
+    if params.get('sentiment_analysis'):
+        response_data['sentiment_analysis'] = params['sentiment_analysis']
+
+    return response_data
+
+
+def render_midi(user, params):
+    """
+    Generate MIDI music from text, record it in history and return the response data
+
+    Used both by the synchronous endpoint and by the job worker.
+    """
+    from .midi_music_generator import get_midi_generator
+
+    midi_generator = get_midi_generator()
+    result = midi_generator.generate_music_from_text(
+        params['text'], params.get('duration', 40), save_midi=params.get('include_midi', False)
+    )
+    primary_file = result['wav_file'] or result['midi_file']
+
+    MusicHistory.objects.create(
+        user=user,
+        mood=result['mood'],
+        genre="MIDI Generated",
+        language="",
+        spotify_song_url=f"/api/music/{os.path.basename(primary_file)}",
+        song_name=f"{result['mood'].title()} MIDI Melody",
+        artist_name="NexGenMusic MIDI AI"
+    )
+
+    return {
+        'midi_url': f"/api/music/{os.path.basename(result['midi_file'])}" if result['midi_file'] else None,
+        'wav_url': f"/api/music/{os.path.basename(result['wav_file'])}" if result['wav_file'] else None,
+        'mood': result['mood'],
+        'tempo': result['tempo'],
+        'duration': result['duration'],
+        'sentiment_score': result['sentiment_score'],
+        'confidence': result['confidence'],
+        'melody_length': result['melody_length'],
+        'instrument': result['instrument'],
+        'notes_used': result['notes_used']
+    }
+
+
+JOB_HANDLERS = {
+    'audio': render_audio,
+    'midi': render_midi,
+}
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running and return it
+
+    The claim is a conditional UPDATE, so concurrent workers never run the
+    same job (this works on SQLite, which has no SELECT ... FOR UPDATE).
+    """
+    while True:
+        job = RenderJob.objects.filter(status='queued').order_by('pk').first()
+        if job is None:
+            return None
+        claimed = RenderJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def fail_stale_jobs():
+    """
+    Mark jobs whose worker disappeared mid-render as failed
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_job_settings()['stale_after_seconds'])
+    return RenderJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='failed', error='Render worker stopped before finishing', finished_at=timezone.now()
+    )
+
+
+def run_job(job):
+    """
+    Execute a claimed job and store its result or error
+
+    The outcome is written only while this claim still holds (the job is
+    running with the started_at set by claim_next_job); a job that
+    fail_stale_jobs already failed, or that another worker has claimed
+    since, is left alone.
+    """
+    try:
+        job.result = JOB_HANDLERS[job.kind](job.user, job.params)
+        job.status = 'done'
+    except Exception as e:
+        job.error = f"{e}\n{traceback.format_exc()}" if settings.DEBUG else str(e)
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    finished = RenderJob.objects.filter(pk=job.pk, status='running', started_at=job.started_at).update(
+        result=job.result, error=job.error, status=job.status, finished_at=job.finished_at
+    )
+    if not finished:
+        job.refresh_from_db()
+    return job
+
+
+def run_worker(poll_interval=1.0, max_jobs=None):
+    """
+    Process jobs until interrupted (or until max_jobs have run)
+    """
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            fail_stale_jobs()
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,87 @@
+"""
+Keyword Matcher
+Whole-word matching of grouped keyword lists in a single pass over the text
+"""
+
+import string
+
+# Bump when matching semantics change, so cached analyses are recomputed
+MATCHER_VERSION = 3
+
+# Punctuation splits words; apostrophes stay so "don't" remains one word
+_SEPARATORS = str.maketrans({char: ' ' for char in string.punctuation.replace("'", '') + '–—…“”'})
+
+
+class KeywordMatcher:
+    """
+    Match many keywords (grouped, e.g. by mood) against whole words
+
+    Every keyword and its inflections are compiled into one lookup table
+    at construction. A match is then one split of the text
+    into words plus a set intersection with the table, instead of a
+    substring scan per keyword, so the cost no longer grows with the
+    number of keywords. Whole-word matching also drops substring false
+    hits: "pain" no longer hits "Spain", "mad" no longer hits "made", and
+    "happy" no longer hits "unhappy". A keyword may belong to several
+    groups; multi-word keywords ("fired up") match consecutive words.
+    Matching is case-insensitive.
+
+    Inflections are listed per keyword ({"relax": ["relaxed", "relaxing"]})
+    rather than generated from suffixes, since blanket suffixes coin new
+    false hits ("fund" -> "fun", "pasted" -> "past", "dated" -> "date").
+    """
+
+    def __init__(self, groups, inflections=None):
+        self.groups = {name: tuple(keywords) for name, keywords in groups.items()}
+        self._keyword_groups = {}
+        for name, keywords in self.groups.items():
+            for keyword in keywords:
+                key = ' '.join(keyword.lower().split())
+                self._keyword_groups.setdefault(key, [])
+                if name not in self._keyword_groups[key]:
+                    self._keyword_groups[key].append(name)
+
+        # Surface form -> keyword; exact keywords win over another keyword's
+        # inflection ("pumped" is its own keyword, not a form of "pump")
+        self._forms = {keyword: keyword for keyword in self._keyword_groups}
+        for keyword, forms in (inflections or {}).items():
+            keyword = ' '.join(keyword.lower().split())
+            if keyword not in self._keyword_groups:
+                raise ValueError(f"Inflections given for unknown keyword: {keyword}")
+            for form in forms:
+                self._forms.setdefault(' '.join(form.lower().split()), keyword)
+
+        # Multi-word surface forms, padded for whole-word substring checks
+        self._phrases = [(f" {form} ", keyword) for form, keyword in self._forms.items() if ' ' in form]
+
+    def matches(self, text):
+        """
+        Set of distinct keywords found in text
+        """
+        words = text.lower().translate(_SEPARATORS).split()
+        forms = self._forms
+        found = {forms[word] for word in forms.keys() & set(words)}
+
+        if self._phrases:
+            joined = f" {' '.join(words)} "
+            found.update(keyword for phrase, keyword in self._phrases if phrase in joined)
+        return found
+
+    def counts(self, text):
+        """
+        {group: distinct keywords matched} for groups with at least one hit,
+        in group definition order
+        """
+        counts = {}
+        for keyword in self.matches(text):
+            for name in self._keyword_groups[keyword]:
+                counts[name] = counts.get(name, 0) + 1
+        # Definition order, so ties break the same way on every call
+        return {name: counts[name] for name in self.groups if name in counts}
+
+    def first_group(self, text, order=None):
+        """
+        First group (in order, default definition order) with a hit, or None
+        """
+        counts = self.counts(text)
+        return next((name for name in (order or self.groups) if name in counts), None)
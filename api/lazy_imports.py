@@ -0,0 +1,68 @@
+"""
+Lazy Imports
+Defer heavy optional dependencies until first use and report what startup loaded
+"""
+
+import importlib.util
+import sys
+import threading
+
+# Modules that should not be imported while Django starts (checked by `manage.py warmup --report`)
+HEAVY_MODULES = (
+    'numpy', 'scipy', 'scipy.signal', 'soundfile', 'midiutil', 'textblob', 'nltk',
+    'torch', 'transformers', 'sklearn',
+)
+
+_lazy_lock = threading.Lock()
+_proxy_types = set()  # Class of not-yet-loaded LazyLoader modules
+
+
+def module_available(name):
+    """
+    Whether name can be imported, without importing it
+    """
+    if name in sys.modules:
+        return sys.modules[name] is not None
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_import(name):
+    """
+    Module proxy for name that runs the real import on first attribute
+    access, or None when the module is not installed
+
+    Lets modules keep the `sf = ...; SOUNDFILE_AVAILABLE = ...` pattern at
+    top level while the import cost moves to the first request that needs
+    it. Errors raised by the module's own initialization (e.g. a missing
+    shared library) surface at that first use instead of at startup.
+    """
+    with _lazy_lock:
+        if name in sys.modules:
+            return sys.modules[name]
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            return None
+        if spec is None or spec.loader is None:
+            return None
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        _proxy_types.add(type(module))
+        return module
+
+
+def loaded_heavy_modules():
+    """
+    HEAVY_MODULES whose real import has run in this process
+
+    Lazy proxies that were never touched do not count.
+    """
+    # type() does not trigger the load; any attribute access would
+    return [name for name in HEAVY_MODULES
+            if sys.modules.get(name) is not None and type(sys.modules[name]) not in _proxy_types]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Run the local model server that holds the transformer pipelines for all web workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--models', nargs='*', default=['sentiment', 'emotion'],
+                            help='Models to load before accepting requests (others load on first use)')
+
+    def handle(self, *args, **options):
+        from api.model_server import MODEL_SPECS, serve
+
+        unknown = [name for name in options['models'] if name not in MODEL_SPECS]
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(unknown)} (choose from {', '.join(MODEL_SPECS)})")
+
+        serve(options['host'], options['port'], preload=options['models'])
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Pre-render a library of mood clips in parallel worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spec-file',
+                            help='JSON file with a list of specs '
+                                 '({"mood", "sentiment_score", "intensity", "duration", "seed"})')
+        parser.add_argument('--moods', nargs='+', default=[],
+                            help='Moods to render when no spec file is given')
+        parser.add_argument('--seeds', type=int, default=1,
+                            help='Number of seeded variations per mood (seeds 0..N-1)')
+        parser.add_argument('--intensity', type=float, default=0.5)
+        parser.add_argument('--sentiment', type=float, default=0.0)
+        parser.add_argument('--duration', type=int, default=None,
+                            help='Clip length in seconds (default 40)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        from api.audio_generator import get_audio_generator
+
+        if options['spec_file']:
+            try:
+                with open(options['spec_file']) as f:
+                    specs = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read spec file: {e}")
+            if not isinstance(specs, list):
+                raise CommandError("Spec file must contain a JSON list")
+        elif options['moods']:
+            specs = [
+                {
+                    'mood': mood,
+                    'sentiment_score': options['sentiment'],
+                    'intensity': options['intensity'],
+                    'duration': options['duration'],
+                    'seed': seed,
+                }
+                for mood in options['moods']
+                for seed in range(options['seeds'])
+            ]
+        else:
+            raise CommandError("Provide --spec-file or --moods")
+
+        generator = get_audio_generator()
+        started = time.perf_counter()
+        failed = 0
+
+        for result in generator.render_batch(specs, workers=options['workers']):
+            config = result['config']
+            if config is None:
+                label = f"[{result['index']}] invalid spec"
+            else:
+                label = f"[{result['index']}] {config.mood} seed={config.seed}"
+            if result['error']:
+                failed += 1
+                self.stderr.write(f"{label} failed after {result['seconds']:.2f}s: {result['error']}")
+            else:
+                self.stdout.write(f"{label} {result['seconds']:.2f}s -> {os.path.basename(result['filepath'])}")
+
+        elapsed = time.perf_counter() - started
+        rendered = len(specs) - failed
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered}/{len(specs)} clips in {elapsed:.2f}s "
+            f"({len(specs) / elapsed if elapsed else 0:.2f} clips/s)"
+        ))
@@ -0,0 +1,61 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(poll_interval, max_jobs):
+    """
+    Entry point for a worker process: set up Django and drain the queue
+    """
+    import django
+    django.setup()
+
+    from api.jobs import run_worker
+    run_worker(poll_interval=poll_interval, max_jobs=max_jobs)
+
+
+class Command(BaseCommand):
+    help = "Run background render workers that process queued audio and MIDI jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes (default 1)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Exit after each worker has processed this many jobs')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        max_jobs = options['max_jobs']
+
+        if processes == 1:
+            from api.jobs import run_worker
+            self.stdout.write("Render worker started")
+            try:
+                run_worker(poll_interval=poll_interval, max_jobs=max_jobs)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(target=_worker_main, args=(poll_interval, max_jobs), daemon=True)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} render workers")
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.warmup import WARMUP_STEPS, warm
+
+
+class Command(BaseCommand):
+    help = ("Report startup cost and time each warmup step. Only models loaded in the model server "
+            "(MODEL_SERVER_URL) stay warm after this command exits; set WARMUP_ON_START to warm "
+            "the web workers themselves")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', nargs='*', default=list(WARMUP_STEPS), choices=list(WARMUP_STEPS),
+                            help='Generators to time (default: all)')
+        parser.add_argument('--models', nargs='*', default=[],
+                            help='Models to load, e.g. sentiment emotion musicgen (default: none)')
+        parser.add_argument('--report', action='store_true',
+                            help='Only report startup cost (URLconf import and heavy modules it loaded)')
+
+    def handle(self, *args, **options):
+        from api.model_server import MODEL_SPECS
+
+        unknown = [name for name in options['models'] if name not in MODEL_SPECS]
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(unknown)} (choose from {', '.join(MODEL_SPECS)})")
+
+        self._report_startup()
+        if options['report']:
+            return
+
+        labels = {step: f"{step} generator" for step in options['steps']}
+        labels.update({name: f"model {name}" for name in options['models']})
+        for target, seconds, error in warm(labels):
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f"{labels[target]:<24} failed: {error}"))
+            else:
+                self.stdout.write(f"{labels[target]:<24} {seconds:7.3f}s")
+
+    def _report_startup(self):
+        """
+        Time the URLconf import (what a worker pays on its first request)
+        and list heavy modules that startup pulled in
+        """
+        import sys
+
+        from django.conf import settings
+        from django.urls import get_resolver
+
+        from api.lazy_imports import loaded_heavy_modules
+
+        already_loaded = settings.ROOT_URLCONF in sys.modules
+        start = time.perf_counter()
+        try:
+            get_resolver().url_patterns
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{'URLconf import':<24} failed: {e}"))
+        else:
+            note = " (already imported)" if already_loaded else ""
+            self.stdout.write(f"{'URLconf import':<24} {time.perf_counter() - start:7.3f}s{note}")
+        heavy = loaded_heavy_modules()
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Heavy modules loaded at startup: {', '.join(heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No heavy modules loaded at startup"))
@@ -3,13 +3,55 @@ MIDI-Based Music Generator
 Integrates with mood detection to create MIDI melodies and convert to audio
 """
 
+import hashlib
+import numpy as np
 import os
-import random
 import subprocess
+import tempfile
+from dataclasses import dataclass
+from io import BytesIO
 from midiutil import MIDIFile
-from datetime import datetime
+from .midi_synth import MIDISynth, find_fluidsynth, get_fluidsynth_pool
 from .ml_mood_predictor import predict_mood_and_sentiment
 
+@dataclass(frozen=True)
+class Melody:
+    """
+    Array-backed melody: one entry per note
+    
+    pitches are MIDI note numbers, durations are in beats and velocities
+    are MIDI velocities. A batch of melodies uses 2-D arrays with one row
+    per melody.
+    """
+    
+    pitches: np.ndarray
+    durations: np.ndarray
+    velocities: np.ndarray
+    
+    def __len__(self):
+        return self.pitches.shape[-1]
+    
+    @property
+    def onsets(self):
+        """
+        Start time of each note in beats
+        """
+        ends = np.cumsum(self.durations, axis=-1)
+        return ends - self.durations
+    
+    @property
+    def total_duration(self):
+        """
+        Length of the melody in beats
+        """
+        return self.durations.sum(axis=-1)
+    
+    def __getitem__(self, index):
+        """
+        Single melody from a batch
+        """
+        return Melody(self.pitches[index], self.durations[index], self.velocities[index])
+
 class MIDIMusicGenerator:
     """
     Generate MIDI-based music from mood detection
@@ -19,6 +61,12 @@ class MIDIMusicGenerator:
         self.output_dir = "generated_music"
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # MIDI -> WAV: built-in synthesizer unless FluidSynth is requested;
+        # FluidSynth and a soundfont are looked up once, here
+        self.synth = MIDISynth(sample_rate=44100)
+        self.synth_backend = os.getenv("MIDI_SYNTH_BACKEND", "numpy")
+        self.fluidsynth = find_fluidsynth()
+        
         # Note mappings
         self.NOTE_MAP = {
             "C3": 48, "D3": 50, "E3": 52, "F3": 53, "G3": 55, "A3": 57, "B3": 59,
@@ -86,14 +134,47 @@ class MIDIMusicGenerator:
                 "chord_progression": ["F4", "G4", "A4", "F4"]
             }
         }
+        
+        # Note sets precompiled to MIDI numbers
+        self.compiled_moods = {
+            mood: self._compile_mood(config) for mood, config in self.mood_configs.items()
+        }
     
-    def generate_music_from_text(self, text, duration=40):
+    def _compile_mood(self, config):
+        """
+        Convert a mood configuration's note names to MIDI number arrays
+        
+        Sentiment picks a register: positive sentiment draws from the upper
+        half of the note set, negative from the lower half.
+        """
+        pitches = np.array([self.NOTE_MAP[note] for note in config["notes"] if note in self.NOTE_MAP],
+                           dtype=np.int16)
+        half = len(pitches) // 2
+        return {
+            "pitches": pitches,
+            "high": pitches[half:],
+            "low": pitches[:half + 1],
+            "rhythm": np.array(config["rhythm_pattern"], dtype=np.float64),
+            "chord_roots": np.array([self.NOTE_MAP[note] for note in config["chord_progression"]
+                                     if note in self.NOTE_MAP], dtype=np.int16),
+        }
+    
+    def _mood_key(self, mood):
+        """
+        Configured mood name for mood (unknown moods fall back to calm)
+        """
+        mood = (mood or "").lower()
+        return mood if mood in self.mood_configs else "calm"
+    
+    def generate_music_from_text(self, text, duration=40, seed=None, save_midi=False):
         """
         Generate music from text input using mood detection
         
         Args:
             text: Input text to analyze
             duration: Duration in seconds (default 40)
+            seed: Optional integer seed for a reproducible melody
+            save_midi: Also persist the .mid file (see generate_music)
             
         Returns:
             dict: Generated music info with file paths
@@ -102,9 +183,9 @@ class MIDIMusicGenerator:
         mood, sentiment_score, confidence, emotions = predict_mood_and_sentiment(text)
         
         # Generate music based on detected mood
-        return self.generate_music(mood, sentiment_score, confidence, duration)
+        return self.generate_music(mood, sentiment_score, confidence, duration, seed=seed, save_midi=save_midi)
     
-    def generate_music(self, mood, sentiment_score=0.0, confidence=0.5, duration=40):
+    def generate_music(self, mood, sentiment_score=0.0, confidence=0.5, duration=40, seed=None, save_midi=False):
         """
         Generate MIDI music based on mood
         
@@ -113,25 +194,37 @@ class MIDIMusicGenerator:
             sentiment_score: Sentiment polarity (-1 to 1)
             confidence: Confidence score (0 to 1)
             duration: Duration in seconds
+            seed: Optional integer seed for a reproducible melody
+            save_midi: Persist the .mid file as well as the WAV. The MIDI
+                file is assembled in memory and only written when asked for
+                (or when no WAV could be rendered); midi_file is None
+                otherwise.
             
         Returns:
             dict: Generated music info
         """
         # Get mood configuration
-        config = self.mood_configs.get(mood.lower(), self.mood_configs["calm"])
+        mood_key = self._mood_key(mood)
+        config = self.mood_configs[mood_key]
         
         # Adjust parameters based on sentiment and confidence
         tempo = self._adjust_tempo(config["tempo"], sentiment_score, confidence)
-        melody_length = max(20, int(duration * tempo / 60 / 2))  # Approximate notes for duration
+        melody_length = self._melody_length(duration, tempo)
         
         # Generate melody
-        melody = self._generate_melody(config, melody_length, sentiment_score)
+        rng = np.random.default_rng(seed)
+        melody = self._generate_melody(self.compiled_moods[mood_key], melody_length, sentiment_score, rng)
         
-        # Create MIDI file
-        midi_file = self._create_midi_file(melody, config, tempo, mood)
+        # Assemble the MIDI file in memory; files are named by content hash
+        midi_bytes = self._build_midi(melody, self.compiled_moods[mood_key], config, tempo, mood)
+        stem = f"{mood}_{tempo}bpm_{hashlib.sha256(midi_bytes).hexdigest()[:16]}"
         
         # Convert to WAV (if possible)
-        wav_file = self._convert_to_wav(midi_file)
+        wav_file = self._convert_to_wav(midi_bytes, stem, melody, self.compiled_moods[mood_key], config, tempo)
+        
+        midi_file = None
+        if save_midi or wav_file is None:
+            midi_file = self._save_midi(midi_bytes, stem)
         
         return {
             "mood": mood,
@@ -146,6 +239,33 @@ class MIDIMusicGenerator:
             "instrument": config["instrument"]
         }
     
+    def generate_melodies(self, mood, count, sentiment_score=0.0, confidence=0.5, duration=40, seed=None):
+        """
+        Generate a batch of melodies for one mood in a single vectorized draw
+        
+        Args:
+            mood: Mood name
+            count: Number of melodies
+            sentiment_score: Sentiment polarity (-1 to 1)
+            confidence: Confidence score (0 to 1)
+            duration: Duration in seconds
+            seed: Optional integer seed
+            
+        Returns:
+            Melody: with (count, notes) arrays; melodies[i] is a single melody
+        """
+        mood_key = self._mood_key(mood)
+        tempo = self._adjust_tempo(self.mood_configs[mood_key]["tempo"], sentiment_score, confidence)
+        length = self._melody_length(duration, tempo)
+        rng = np.random.default_rng(seed)
+        return self._generate_melody(self.compiled_moods[mood_key], (count, length), sentiment_score, rng)
+    
+    def _melody_length(self, duration, tempo):
+        """
+        Approximate number of notes for duration at tempo
+        """
+        return max(20, int(duration * tempo / 60 / 2))
+    
     def _adjust_tempo(self, base_tempo, sentiment_score, confidence):
         """
         Adjust tempo based on sentiment and confidence
@@ -159,46 +279,34 @@ class MIDIMusicGenerator:
         adjusted_tempo = int((base_tempo + sentiment_adjustment) * confidence_multiplier)
         return max(60, min(200, adjusted_tempo))  # Keep within reasonable range
     
-    def _generate_melody(self, config, length, sentiment_score):
-        """
-        Generate melody based on mood configuration
-        """
-        notes = config["notes"]
-        rhythm_pattern = config["rhythm_pattern"]
-        
-        melody = []
-        
-        for i in range(length):
-            # Choose note (with some randomness but mood-appropriate)
-            if sentiment_score > 0.3:
-                # Positive sentiment: prefer higher notes
-                note = random.choice(notes[len(notes)//2:])
-            elif sentiment_score < -0.3:
-                # Negative sentiment: prefer lower notes
-                note = random.choice(notes[:len(notes)//2 + 1])
-            else:
-                # Neutral: any note
-                note = random.choice(notes)
-            
-            # Choose duration from rhythm pattern
-            duration = random.choice(rhythm_pattern)
-            
-            melody.append({
-                "note": note,
-                "duration": duration,
-                "velocity": random.randint(70, 100)
-            })
+    def _generate_melody(self, compiled, shape, sentiment_score, rng):
+        """
+        Generate melody based on a compiled mood configuration
+        
+        Pitches, durations and velocities are each drawn in one vectorized
+        call; shape is the note count or (melodies, notes) for a batch.
+        """
+        # Choose notes (with some randomness but mood-appropriate)
+        if sentiment_score > 0.3:
+            # Positive sentiment: prefer higher notes
+            pool = compiled["high"]
+        elif sentiment_score < -0.3:
+            # Negative sentiment: prefer lower notes
+            pool = compiled["low"]
+        else:
+            # Neutral: any note
+            pool = compiled["pitches"]
         
-        return melody
+        return Melody(
+            pitches=rng.choice(pool, size=shape),
+            durations=rng.choice(compiled["rhythm"], size=shape),
+            velocities=rng.integers(70, 101, size=shape, dtype=np.int16),
+        )
     
-    def _create_midi_file(self, melody, config, tempo, mood):
+    def _build_midi(self, melody, compiled, config, tempo, mood):
         """
-        Create MIDI file from melody
+        Assemble the MIDI file for a melody in memory and return its bytes
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{mood}_{tempo}bpm_{timestamp}.mid"
-        filepath = os.path.join(self.output_dir, filename)
-        
         # Create MIDI file
         midi = MIDIFile(1)
         track = 0
@@ -208,95 +316,107 @@ class MIDIMusicGenerator:
         midi.addProgramChange(track, 0, 0, config["instrument"])
         
         # Add melody notes
-        time = 0
-        for note_info in melody:
-            note_name = note_info["note"]
-            duration = note_info["duration"]
-            velocity = note_info["velocity"]
-            
-            if note_name in self.NOTE_MAP:
-                midi_note = self.NOTE_MAP[note_name]
-                midi.addNote(track, 0, midi_note, time, duration, velocity)
-            
-            time += duration
+        for pitch, time, duration, velocity in zip(melody.pitches.tolist(), melody.onsets.tolist(),
+                                                   melody.durations.tolist(), melody.velocities.tolist()):
+            midi.addNote(track, 0, pitch, time, duration, velocity)
         
         # Add simple chord progression as harmony
-        self._add_harmony(midi, track, config, tempo, time)
+        self._add_harmony(midi, track, compiled, tempo, float(melody.total_duration))
         
-        # Save MIDI file
-        with open(filepath, "wb") as f:
-            midi.writeFile(f)
+        buffer = BytesIO()
+        midi.writeFile(buffer)
+        return buffer.getvalue()
+    
+    def _save_midi(self, midi_bytes, stem):
+        """
+        Persist MIDI bytes as <stem>.mid in output_dir and return the path
         
+        Names come from the content hash, so an existing file already
+        holds exactly these bytes and is not rewritten.
+        """
+        filepath = os.path.join(self.output_dir, f"{stem}.mid")
+        if not os.path.exists(filepath):
+            _write_atomic(filepath, midi_bytes)
         return filepath
     
-    def _add_harmony(self, midi, track, config, tempo, melody_duration):
+    def _harmony_notes(self, compiled, melody_duration):
         """
-        Add simple chord progression as harmony
+        Triads (root, third, fifth) spread evenly over the melody
+        
+        Returns (pitches, onsets, durations, velocities) arrays in beats.
         """
-        chord_progression = config["chord_progression"]
-        chord_duration = melody_duration / len(chord_progression)
-        
-        time = 0
-        for chord_root in chord_progression:
-            if chord_root in self.NOTE_MAP:
-                root_note = self.NOTE_MAP[chord_root]
-                
-                # Add triad (root, third, fifth)
-                midi.addNote(track, 1, root_note, time, chord_duration, 60)
-                midi.addNote(track, 1, root_note + 4, time, chord_duration, 50)  # Third
-                midi.addNote(track, 1, root_note + 7, time, chord_duration, 50)  # Fifth
-            
-            time += chord_duration
+        roots = compiled["chord_roots"]
+        if len(roots) == 0:
+            empty = np.zeros(0)
+            return empty.astype(np.int16), empty, empty, empty.astype(np.int16)
+        chord_duration = melody_duration / len(roots)
+        
+        pitches = (roots[:, None] + np.array([0, 4, 7], dtype=np.int16)).ravel()
+        onsets = np.repeat(np.arange(len(roots)) * chord_duration, 3)
+        durations = np.full(len(pitches), chord_duration)
+        velocities = np.tile(np.array([60, 50, 50], dtype=np.int16), len(roots))
+        return pitches, onsets, durations, velocities
     
-    def _convert_to_wav(self, midi_file):
+    def _add_harmony(self, midi, track, compiled, tempo, melody_duration):
         """
-        Convert MIDI to WAV using FluidSynth (if available)
+        Add simple chord progression as harmony
         """
-        if not os.path.exists(midi_file):
-            return None
+        for pitch, time, duration, velocity in zip(*(part.tolist() for part in self._harmony_notes(compiled, melody_duration))):
+            midi.addNote(track, 1, pitch, time, duration, velocity)
+    
+    def _convert_to_wav(self, midi_bytes, stem, melody, compiled, config, tempo):
+        """
+        Render the melody and harmony to <stem>.wav in output_dir
         
-        wav_file = midi_file.replace('.mid', '.wav')
+        The built-in synthesizer renders the note arrays directly, so no
+        process is spawned. With MIDI_SYNTH_BACKEND=fluidsynth the notes go
+        to the persistent FluidSynth pool (soundfont kept loaded), or, if
+        pyfluidsynth is missing, the MIDI bytes go to the fluidsynth CLI.
+        """
+        wav_file = os.path.join(self.output_dir, f"{stem}.wav")
         
-        # Try to find FluidSynth and a soundfont
-        soundfonts = [
-            "/usr/share/sounds/sf2/FluidR3_GM.sf2",  # Linux
-            "/System/Library/Components/CoreAudio.component/Contents/Resources/gs_instruments.dls",  # macOS
-            "C:\\Windows\\System32\\drivers\\gm.dls",  # Windows
+        # Harmony is on channel 1, which keeps the default program (piano)
+        parts = [
+            (config["instrument"], melody.pitches, melody.onsets, melody.durations, melody.velocities),
+            (0, *self._harmony_notes(compiled, float(melody.total_duration))),
         ]
         
-        fluidsynth_cmd = None
-        soundfont = None
+        if self.synth_backend == "fluidsynth":
+            pool = get_fluidsynth_pool()
+            if pool is None:
+                return self._fluidsynth_to_wav(midi_bytes, wav_file)
+            return self.synth.write_wav(pool.render(parts, tempo), wav_file)
+        
+        samples = self.synth.render(parts, tempo)
+        return self.synth.write_wav(samples, wav_file)
+    
+    def _fluidsynth_to_wav(self, midi_bytes, wav_file):
+        """
+        Convert MIDI to WAV using the FluidSynth CLI (if available)
+        
+        The CLI only reads files, so the MIDI bytes go through a temporary
+        file that is removed afterwards.
+        """
+        if not self.fluidsynth:
+            return None
         
-        # Check for FluidSynth
+        fluidsynth_cmd, soundfont = self.fluidsynth
+        fd, midi_file = tempfile.mkstemp(suffix='.mid')
         try:
-            subprocess.run(["fluidsynth", "--version"], capture_output=True, check=True)
-            fluidsynth_cmd = "fluidsynth"
+            with os.fdopen(fd, 'wb') as f:
+                f.write(midi_bytes)
+            cmd = [
+                fluidsynth_cmd, "-ni", soundfont, midi_file,
+                "-F", wav_file, "-r", "44100"
+            ]
+            subprocess.run(cmd, capture_output=True, check=True)
+            
+            if os.path.exists(wav_file):
+                return wav_file
         except (subprocess.CalledProcessError, FileNotFoundError):
-            try:
-                subprocess.run(["fluid-synth", "--version"], capture_output=True, check=True)
-                fluidsynth_cmd = "fluid-synth"
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                pass
-        
-        # Find soundfont
-        for sf in soundfonts:
-            if os.path.exists(sf):
-                soundfont = sf
-                break
-        
-        # Convert if both FluidSynth and soundfont are available
-        if fluidsynth_cmd and soundfont:
-            try:
-                cmd = [
-                    fluidsynth_cmd, "-ni", soundfont, midi_file,
-                    "-F", wav_file, "-r", "44100"
-                ]
-                subprocess.run(cmd, capture_output=True, check=True)
-                
-                if os.path.exists(wav_file):
-                    return wav_file
-            except subprocess.CalledProcessError:
-                pass
+            pass
+        finally:
+            os.remove(midi_file)
         
         return None
     
@@ -317,6 +437,20 @@ class MIDIMusicGenerator:
             "format": "MIDI" if filepath.endswith('.mid') else "WAV"
         }
 
+def _write_atomic(filepath, data):
+    """
+    Write bytes to filepath via a temporary file and rename
+    """
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(filepath) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 # Global instance
 _midi_generator = None
 
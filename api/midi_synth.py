@@ -0,0 +1,378 @@
+"""
+In-Process MIDI Synthesizer
+Renders melody and harmony note arrays straight to PCM with additive voices
+"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import wave
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+# Optional: libfluidsynth bindings for the persistent render pool
+try:
+    import fluidsynth as pyfluidsynth
+    PYFLUIDSYNTH_AVAILABLE = hasattr(pyfluidsynth, 'Synth')
+except (ImportError, OSError):
+    PYFLUIDSYNTH_AVAILABLE = False
+    pyfluidsynth = None
+
+
+@dataclass(frozen=True)
+class Voice:
+    """
+    Additive voice: a set of decaying harmonics with a short attack/release
+
+    Harmonic k (1-based) has amplitude harmonics[k-1] and decays at
+    decay + decay_slope * (k - 1) per second, so upper partials die away
+    first like a struck or plucked string. drive > 0 adds tanh saturation.
+    """
+
+    harmonics: Tuple[float, ...]
+    decay: float
+    decay_slope: float
+    attack: float = 0.005
+    release: float = 0.05
+    drive: float = 0.0
+
+
+# Voices for the General MIDI programs used by the mood configurations
+GM_VOICES = {
+    0: Voice((1.0, 0.5, 0.3, 0.2, 0.12, 0.06), decay=1.2, decay_slope=1.0),     # Acoustic Grand Piano
+    1: Voice((1.0, 0.6, 0.4, 0.25, 0.15, 0.1), decay=1.4, decay_slope=1.2),     # Bright Acoustic Piano
+    25: Voice((1.0, 0.7, 0.45, 0.3, 0.2, 0.1), decay=2.0, decay_slope=1.5,      # Acoustic Guitar (steel)
+              attack=0.003),
+    30: Voice((1.0, 0.15, 0.6, 0.1, 0.4, 0.08, 0.3), decay=0.4, decay_slope=0.2,  # Distortion Guitar
+              attack=0.003, drive=3.0),
+}
+DEFAULT_VOICE = GM_VOICES[0]
+
+SOUNDFONT_PATHS = [
+    "/usr/share/sounds/sf2/FluidR3_GM.sf2",  # Linux
+    "/System/Library/Components/CoreAudio.component/Contents/Resources/gs_instruments.dls",  # macOS
+    "C:\\Windows\\System32\\drivers\\gm.dls",  # Windows
+]
+
+
+@lru_cache(maxsize=1)
+def find_soundfont():
+    """
+    First installed soundfont (FLUIDSYNTH_SOUNDFONT overrides), or None
+    """
+    candidates = [os.getenv("FLUIDSYNTH_SOUNDFONT")] + SOUNDFONT_PATHS
+    return next((path for path in candidates if path and os.path.exists(path)), None)
+
+
+@lru_cache(maxsize=1)
+def find_fluidsynth():
+    """
+    (fluidsynth executable, soundfont) if both are installed, else None
+
+    Looked up once per process on PATH and disk; nothing is spawned.
+    """
+    command = shutil.which("fluidsynth") or shutil.which("fluid-synth")
+    soundfont = find_soundfont()
+    if command and soundfont:
+        return command, soundfont
+    return None
+
+
+# Seconds of each (program, pitch) waveform kept in the cache; longer notes
+# are synthesized per note
+TEMPLATE_SECONDS = 2.0
+
+
+def _synthesize(voice, pitch, count, sample_rate):
+    """
+    count samples of a voice's unit-velocity waveform, before the envelope
+    """
+    t = np.arange(count, dtype=np.float64) / sample_rate
+    freq = 440.0 * 2 ** ((pitch - 69) / 12)
+
+    wave_out = np.zeros_like(t)
+    for k, amplitude in enumerate(voice.harmonics, start=1):
+        if freq * k >= sample_rate / 2:
+            break
+        wave_out += amplitude * np.sin(2 * np.pi * freq * k * t) * np.exp(-(voice.decay + voice.decay_slope * (k - 1)) * t)
+    wave_out /= sum(voice.harmonics)
+
+    if voice.drive:
+        wave_out = np.tanh(wave_out * voice.drive) / np.tanh(voice.drive)
+    return wave_out.astype(np.float32)
+
+
+@lru_cache(maxsize=64)
+def _note_wave(program, pitch, sample_rate):
+    """
+    First TEMPLATE_SECONDS of a note's waveform, shared by every note of
+    that program and pitch whatever its length
+
+    Length only decides where the waveform is cut and where the release
+    starts, so both are applied at mix time (see _note_samples) and each
+    entry is a fixed size.
+    """
+    voice = GM_VOICES.get(program, DEFAULT_VOICE)
+    wave_out = _synthesize(voice, pitch, int(TEMPLATE_SECONDS * sample_rate), sample_rate)
+    wave_out.flags.writeable = False
+    return wave_out
+
+
+@lru_cache(maxsize=16)
+def _ramp(count, rising):
+    """
+    Linear fade in (rising) or out over count samples
+    """
+    ramp = np.linspace(0, 1, count, endpoint=False) if rising else np.linspace(1, 0, count)
+    ramp = ramp.astype(np.float32)
+    ramp.flags.writeable = False
+    return ramp
+
+
+def _note_samples(program, pitch, length, gain, sample_rate):
+    """
+    Enveloped samples of one note: length samples held, then the release
+    """
+    voice = GM_VOICES.get(program, DEFAULT_VOICE)
+    release = int(voice.release * sample_rate)
+    count = length + release
+    wave_out = _note_wave(program, pitch, sample_rate)
+    if count > len(wave_out):
+        wave_out = _synthesize(voice, pitch, count, sample_rate)
+    samples = wave_out[:count] * np.float32(gain)
+
+    # Linear attack, then a linear release after the note is let go
+    attack = _ramp(max(1, int(voice.attack * sample_rate)), True)[:length]
+    samples[:len(attack)] *= attack
+    if release:
+        samples[length:] *= _ramp(release, False)
+    return samples
+
+
+class MIDISynth:
+    """
+    Render note arrays to PCM without leaving the process
+
+    Notes are given in beats (as in the MIDI file) and converted with the
+    tempo; each distinct (program, pitch) waveform is synthesized once and
+    cut, enveloped and mixed in at every onset.
+    """
+
+    def __init__(self, sample_rate=44100):
+        self.sample_rate = sample_rate
+
+    def render(self, parts, tempo):
+        """
+        Mix note parts to a float32 buffer
+
+        Args:
+            parts: Iterable of (program, pitches, onsets, durations, velocities)
+                arrays; onsets and durations are in beats
+            tempo: Beats per minute
+
+        Returns:
+            np.ndarray: float32 samples normalized to a 0.8 peak
+        """
+        seconds_per_beat = 60.0 / tempo
+        events = []
+        end = 0
+        for program, pitches, onsets, durations, velocities in parts:
+            release = int(GM_VOICES.get(program, DEFAULT_VOICE).release * self.sample_rate)
+            starts = np.round(np.asarray(onsets) * seconds_per_beat * self.sample_rate).astype(np.int64)
+            lengths = np.maximum(np.round(np.asarray(durations) * seconds_per_beat * self.sample_rate).astype(np.int64), 1)
+            gains = np.asarray(velocities, dtype=np.float32) / 127.0
+            for start, length, pitch, gain in zip(starts.tolist(), lengths.tolist(),
+                                                  np.asarray(pitches).tolist(), gains.tolist()):
+                events.append((start, program, int(pitch), length, gain))
+                end = max(end, start + length + release)
+
+        buffer = np.zeros(end, dtype=np.float32)
+        for start, program, pitch, length, gain in events:
+            samples = _note_samples(program, pitch, length, gain, self.sample_rate)
+            buffer[start:start + len(samples)] += samples
+
+        return _normalize(buffer)
+
+    def write_wav(self, samples, filepath):
+        """
+        Write float samples in [-1, 1] as 16-bit PCM WAV
+        """
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+        # Written under a temporary name so concurrent renders of the same
+        # content-named file never expose a partial WAV
+        fd, temp_path = tempfile.mkstemp(suffix='.wav.tmp', dir=os.path.dirname(filepath) or '.')
+        os.close(fd)
+        try:
+            with wave.open(temp_path, 'wb') as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(self.sample_rate)
+                out.writeframes(pcm.tobytes())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return filepath
+
+
+def _normalize(buffer, peak_level=0.8):
+    """
+    Scale buffer in place to peak_level
+    """
+    peak = float(np.max(np.abs(buffer), initial=0.0))
+    if peak > 0:
+        buffer *= peak_level / peak
+    return buffer
+
+
+class FluidSynthPool:
+    """
+    Long-lived FluidSynth workers with the soundfont kept loaded
+
+    Each worker thread owns one libfluidsynth synthesizer (they are not
+    shared, so no locking is needed around synthesis) and takes render
+    jobs from a shared queue. The soundfont is loaded when a worker starts
+    and again only when the worker is recycled after max_jobs renders,
+    which bounds any slow leak inside the synth.
+    """
+
+    def __init__(self, soundfont, workers=2, max_jobs=200, sample_rate=44100):
+        if not PYFLUIDSYNTH_AVAILABLE:
+            raise RuntimeError("pyfluidsynth is not installed")
+        self.soundfont = soundfont
+        self.max_jobs = max_jobs
+        self.sample_rate = sample_rate
+        self._jobs = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"fluidsynth-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, parts, tempo):
+        """
+        Queue a render; returns a Future for the float32 samples
+        """
+        future = Future()
+        self._jobs.put((parts, tempo, future))
+        return future
+
+    def render(self, parts, tempo, timeout=None):
+        """
+        Render note parts (see MIDISynth.render) and wait for the samples
+        """
+        return self.submit(parts, tempo).result(timeout)
+
+    def shutdown(self):
+        """
+        Stop the workers once the queued jobs are done
+        """
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _load(self):
+        """
+        New synthesizer with the soundfont loaded
+        """
+        synth = pyfluidsynth.Synth(samplerate=float(self.sample_rate))
+        sfid = synth.sfload(self.soundfont)
+        if sfid < 0:
+            synth.delete()
+            raise RuntimeError(f"Could not load soundfont: {self.soundfont}")
+        return synth, sfid
+
+    def _worker_loop(self):
+        synth = None
+        completed = 0
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            parts, tempo, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if synth is None:
+                    synth = self._load()
+                    completed = 0
+                future.set_result(self._render(synth, parts, tempo))
+            except Exception as e:
+                future.set_exception(e)
+            completed += 1
+            if synth is not None and completed >= self.max_jobs:
+                synth[0].delete()
+                synth = None
+        if synth is not None:
+            synth[0].delete()
+
+    def _render(self, loaded, parts, tempo):
+        """
+        Play the note parts through the synth and capture mono float32 samples
+        """
+        synth, sfid = loaded
+        seconds_per_beat = 60.0 / tempo
+        events = []
+        for channel, (program, pitches, onsets, durations, velocities) in enumerate(parts):
+            # Silence anything left over from the previous job
+            synth.cc(channel, 120, 0)
+            synth.cc(channel, 121, 0)
+            synth.program_select(channel, sfid, 0, int(program))
+            starts = np.round(np.asarray(onsets) * seconds_per_beat * self.sample_rate).astype(np.int64)
+            ends = starts + np.maximum(np.round(np.asarray(durations) * seconds_per_beat * self.sample_rate).astype(np.int64), 1)
+            for start, end, pitch, velocity in zip(starts.tolist(), ends.tolist(),
+                                                   np.asarray(pitches).tolist(), np.asarray(velocities).tolist()):
+                # Note-offs sort before note-ons at the same sample
+                events.append((end, 0, channel, int(pitch), 0))
+                events.append((start, 1, channel, int(pitch), int(velocity)))
+        events.sort()
+
+        chunks = []
+        cursor = 0
+        for time, is_on, channel, pitch, velocity in events:
+            if time > cursor:
+                chunks.append(synth.get_samples(time - cursor))
+                cursor = time
+            if is_on:
+                synth.noteon(channel, pitch, velocity)
+            else:
+                synth.noteoff(channel, pitch)
+        chunks.append(synth.get_samples(self.sample_rate))  # One second of release tail
+
+        stereo = np.concatenate(chunks).astype(np.float32).reshape(-1, 2)
+        return _normalize(stereo.mean(axis=1) / 32768.0)
+
+
+_fluidsynth_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_fluidsynth_pool():
+    """
+    Get or create the process-wide FluidSynth pool (singleton)
+
+    Returns None when pyfluidsynth or a soundfont is missing. Pool size and
+    recycling come from FLUIDSYNTH_WORKERS and FLUIDSYNTH_MAX_JOBS.
+    """
+    global _fluidsynth_pool
+    if _fluidsynth_pool is None:
+        soundfont = find_soundfont()
+        if not PYFLUIDSYNTH_AVAILABLE or soundfont is None:
+            return None
+        with _pool_lock:
+            if _fluidsynth_pool is None:
+                _fluidsynth_pool = FluidSynthPool(
+                    soundfont,
+                    workers=int(os.getenv("FLUIDSYNTH_WORKERS", "2")),
+                    max_jobs=int(os.getenv("FLUIDSYNTH_MAX_JOBS", "200")),
+                )
+    return _fluidsynth_pool
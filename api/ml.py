@@ -1,103 +1,145 @@
-import os
-from functools import lru_cache
-from typing import Dict, Tuple
-
-import numpy as np
-import soundfile as sf
-from transformers import pipeline
-
-
-MOOD_LABELS = [
-	"admiration",
-	"amusement",
-	"anger",
-	"annoyance",
-	"approval",
-	"caring",
-	"confusion",
-	"curiosity",
-	"desire",
-	"disappointment",
-	"disgust",
-	"excitement",
-	"fear",
-	"gratitude",
-	"grief",
-	"joy",
-	"love",
-	"nervousness",
-	"optimism",
-	"pride",
-	"realization",
-	"relief",
-	"remorse",
-	"sadness",
-	"surprise",
-	"neutral",
-]
-
-
-@lru_cache(maxsize=1)
-def get_musicgen_pipe():
-	return pipeline("text-to-audio", model="facebook/musicgen-small")
-
-
-@lru_cache(maxsize=1)
-def get_sentiment_pipe():
-	return pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
-
-
-@lru_cache(maxsize=1)
-def get_mood_pipe():
-	# Smaller multi-label emotion classifier (go-emotions distilled)
-	return pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", top_k=None)
-
-
-def predict_sentiment_and_mood(prompt: str) -> Tuple[str, str]:
-	sentiment = get_sentiment_pipe()(prompt)[0]["label"].lower()
-	results = get_mood_pipe()(prompt)
-	if isinstance(results, list) and results and isinstance(results[0], list):
-		# top_k=None returns list of lists; take top label from first entry
-		results = results[0]
-	mood = max(results, key=lambda r: r["score"])["label"].lower()
-	return mood, sentiment
-
-
-def generate_music(prompt: str, duration_sec: int, output_path: str) -> Dict[str, str]:
-	pipe = get_musicgen_pipe()
-	result = pipe(prompt, forward_params={"do_sample": True, "guidance_scale": 4})
-	# The pipeline may ignore duration; truncate/pad to requested duration if needed
-	audio = np.asarray(result["audio"], dtype=np.float32)
-	sr = result["sampling_rate"]
-	target_len = int(duration_sec * sr)
-
-	if audio.ndim == 1:
-		if audio.shape[0] > target_len:
-			audio = audio[:target_len]
-		elif audio.shape[0] < target_len:
-			audio = np.pad(audio, (0, target_len - audio.shape[0]))
-	elif audio.ndim == 2:
-		current_len = audio.shape[1]
-		if current_len > target_len:
-			audio = audio[:, :target_len]
-		elif current_len < target_len:
-			pad_width = ((0, 0), (0, target_len - current_len))
-			audio = np.pad(audio, pad_width)
-	else:
-		# Collapse any unexpected dimensions (e.g., batch, channels, samples)
-		audio = audio.reshape(-1, audio.shape[-1])
-		current_len = audio.shape[1]
-		if current_len > target_len:
-			audio = audio[:, :target_len]
-		elif current_len < target_len:
-			pad_width = ((0, 0), (0, target_len - current_len))
-			audio = np.pad(audio, pad_width)
-		# mixdown to mono for writing
-		audio = np.mean(audio, axis=0)
-
-	if audio.ndim == 2:
-		audio = audio.T  # soundfile expects (n_frames, n_channels)
-	sf.write(output_path, audio, sr)
-	return {"path": output_path, "sampling_rate": sr}
-
-
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from .analysis_cache import AnalysisCache
+from .model_server import SHARED_TEXT_ENCODER, infer, load_model, model_version
+
+
+MOOD_LABELS = [
+	"admiration",
+	"amusement",
+	"anger",
+	"annoyance",
+	"approval",
+	"caring",
+	"confusion",
+	"curiosity",
+	"desire",
+	"disappointment",
+	"disgust",
+	"excitement",
+	"fear",
+	"gratitude",
+	"grief",
+	"joy",
+	"love",
+	"nervousness",
+	"optimism",
+	"pride",
+	"realization",
+	"relief",
+	"remorse",
+	"sadness",
+	"surprise",
+	"neutral",
+]
+
+
+# Pipelines are defined in model_server.MODEL_SPECS. The getters load them
+# in this process; inference below goes through infer(), which uses the
+# model server when MODEL_SERVER_URL is set.
+def get_musicgen_pipe():
+	# Backed by the shared MusicGen holder (api/musicgen.py)
+	return load_model("musicgen")
+
+
+def get_sentiment_pipe():
+	# With SHARED_TEXT_ENCODER set this is derived from the emotion model's
+	# output rather than the separate SST-2 model (the default)
+	return load_model("sentiment")
+
+
+def get_mood_pipe():
+	# Smaller multi-label emotion classifier (go-emotions distilled)
+	return load_model("emotion")
+
+
+def predict_sentiment_and_mood(prompt: str) -> Tuple[str, str]:
+	return predict_sentiment_and_mood_batch([prompt])[0]
+
+
+def predict_sentiment_and_mood_batch(prompts: List[str], batch_size: int = 32) -> List[Tuple[str, str]]:
+	"""
+	(mood, sentiment) for each prompt, run over the whole list in padded
+	batches of batch_size. With SHARED_TEXT_ENCODER both come from a single
+	emotion-model pass; otherwise the sentiment and emotion models each run
+	once. Results are cached by normalized prompt (see analysis_cache).
+	"""
+	prompts = list(prompts)
+	if not prompts:
+		return []
+	return _analysis_cache().get_or_compute(prompts, lambda texts: _predict_batch(texts, batch_size))
+
+
+@lru_cache(maxsize=None)
+def _analysis_cache():
+	# Created on first use, after Django settings are loaded. The version is
+	# re-read on every lookup (quantization can change at runtime) and covers
+	# both model ids (either may be the emotion model, see SHARED_TEXT_ENCODER)
+	return AnalysisCache("sentiment_mood", lambda: f"{model_version('sentiment')}|{model_version('emotion')}", casefold=False)
+
+
+def _predict_batch(prompts: List[str], batch_size: int) -> List[Tuple[str, str]]:
+	if SHARED_TEXT_ENCODER:
+		analyses = infer("text_analysis", prompts, batch_size=batch_size)
+		sentiments = [analysis["sentiment"] for analysis in analyses]
+		emotions = [analysis["emotions"] for analysis in analyses]
+	else:
+		sentiments = infer("sentiment", prompts, batch_size=batch_size)
+		emotions = infer("emotion", prompts, batch_size=batch_size)
+	results = []
+	for sentiment, scores in zip(sentiments, emotions):
+		if isinstance(sentiment, list):
+			sentiment = sentiment[0]
+		if isinstance(scores, list) and scores and isinstance(scores[0], list):
+			# top_k=None returns list of lists; take top label from first entry
+			scores = scores[0]
+		mood = max(scores, key=lambda r: r["score"])["label"].lower()
+		results.append((mood, sentiment["label"].lower()))
+	return results
+
+
+def generate_music(prompt: str, duration_sec: int, output_path: str) -> Dict[str, str]:
+	result = infer(
+		"musicgen", [prompt], timeout=600, batch_size=1,
+		forward_params={"do_sample": True, "guidance_scale": 4, "max_new_tokens": int(duration_sec * 50)},
+	)[0]
+	# The pipeline may ignore duration; truncate/pad to requested duration if needed
+	audio = np.asarray(result["audio"], dtype=np.float32)
+	sr = result["sampling_rate"]
+	target_len = int(duration_sec * sr)
+
+	if audio.ndim == 1:
+		if audio.shape[0] > target_len:
+			audio = audio[:target_len]
+		elif audio.shape[0] < target_len:
+			audio = np.pad(audio, (0, target_len - audio.shape[0]))
+	elif audio.ndim == 2:
+		current_len = audio.shape[1]
+		if current_len > target_len:
+			audio = audio[:, :target_len]
+		elif current_len < target_len:
+			pad_width = ((0, 0), (0, target_len - current_len))
+			audio = np.pad(audio, pad_width)
+	else:
+		# Collapse any unexpected dimensions (e.g., batch, channels, samples)
+		audio = audio.reshape(-1, audio.shape[-1])
+		current_len = audio.shape[1]
+		if current_len > target_len:
+			audio = audio[:, :target_len]
+		elif current_len < target_len:
+			pad_width = ((0, 0), (0, target_len - current_len))
+			audio = np.pad(audio, pad_width)
+		# mixdown to mono for writing
+		audio = np.mean(audio, axis=0)
+
+	if audio.ndim == 2:
+		audio = audio.T  # soundfile expects (n_frames, n_channels)
+	sf.write(output_path, audio, sr)
+	return {"path": output_path, "sampling_rate": sr}
+
+
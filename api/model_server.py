@@ -0,0 +1,377 @@
+"""
+Model Server
+Loads the transformer pipelines once in a dedicated process and serves batched
+inference over localhost HTTP; web workers call infer() as thin clients
+"""
+
+import base64
+import contextlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .lazy_imports import lazy_import
+
+# Only needed to (de)serialize arrays; not loaded until then
+np = lazy_import("numpy")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _musicgen_pipeline():
+    """
+    MusicGen through the shared holder's batching scheduler, so the server
+    and in-process callers keep a single resident copy and concurrent
+    prompts share generate calls
+
+    The model is loaded and warmed up here, so preloading "musicgen" (or
+    the first request's load) also covers the first-inference cost.
+    """
+    from .musicgen import get_musicgen, get_musicgen_batcher
+
+    get_musicgen().warmup()  # Loads the model, then runs one tiny generation
+    return get_musicgen_batcher().as_pipeline()
+
+
+def _text_analyzer():
+    """
+    Sentiment + emotion from one emotion-model pass (see text_analyzer)
+    """
+    from .text_analyzer import TextAnalyzer
+    return TextAnalyzer()
+
+
+def _shared_sentiment():
+    """
+    Sentiment derived from the emotion model instead of a second transformer
+    """
+    from .text_analyzer import TextAnalyzer
+    return TextAnalyzer().sentiment_pipeline()
+
+
+# SHARED_TEXT_ENCODER=1 derives sentiment from the emotion model's output instead
+# of running the separate SST-2 model. Off by default until scripts/test_accuracy.py
+# shows parity: the derived label counts "surprise" as positive, ignores the
+# "neutral" mass, and falls back to POSITIVE 0.5 when no polar emotion scores.
+# Compare the two with scripts/test_accuracy.py --shared.
+SHARED_TEXT_ENCODER = os.getenv("SHARED_TEXT_ENCODER", "0").lower() in ("1", "true", "yes")
+
+# The two implementations of the "sentiment" model
+SENTIMENT_SPECS = {
+    "sst2": ("sentiment-analysis", "distilbert-base-uncased-finetuned-sst-2-english", {}),
+    "shared": _shared_sentiment,
+}
+
+# Every model the app uses: name -> (pipeline task, model id or path, pipeline kwargs),
+# or a loader returning a pipeline-compatible callable
+MODEL_SPECS = {
+    "sentiment": SENTIMENT_SPECS["shared" if SHARED_TEXT_ENCODER else "sst2"],
+    "finetuned_sentiment": ("sentiment-analysis", os.path.join(BASE_DIR, "sentiment_model"), {}),
+    "emotion": ("text-classification", "j-hartmann/emotion-english-distilroberta-base", {"top_k": None}),
+    "musicgen": _musicgen_pipeline,
+    "text_analysis": _text_analyzer,
+}
+
+DEFAULT_BATCH_SIZE = 32
+
+
+class ModelServerError(Exception):
+    """
+    Raised when the model server rejects a request
+    """
+
+
+# ----------------------
+# In-process inference
+# ----------------------
+
+_model_locks = {name: threading.Lock() for name in MODEL_SPECS}
+_pipelines = {}  # name -> loaded pipeline
+
+
+def load_model(name):
+    """
+    Load a pipeline from MODEL_SPECS (once per process)
+
+    Torch thread limits are applied first, and Linear layers are int8
+    quantized when MODEL_QUANTIZE is set (see cpu_inference). The load
+    runs under the model's lock, so concurrent first requests (the
+    server is threaded) wait for one load instead of each building a copy.
+    """
+    pipe = _pipelines.get(name)
+    if pipe is not None:
+        return pipe
+
+    with _model_locks[name]:
+        pipe = _pipelines.get(name)
+        if pipe is not None:
+            return pipe
+
+        from .cpu_inference import configure_threads, optimize_pipeline
+
+        configure_threads()
+        spec = MODEL_SPECS[name]
+        if callable(spec):
+            pipe = spec()
+        else:
+            from transformers import pipeline
+
+            task, model, kwargs = spec
+            pipe = optimize_pipeline(pipeline(task, model=model, **kwargs))
+        _pipelines[name] = pipe
+    return pipe
+
+
+def unload_models():
+    """
+    Drop every loaded pipeline so the next use reloads it (e.g. after
+    changing MODEL_QUANTIZE)
+    """
+    with contextlib.ExitStack() as stack:
+        for lock in _model_locks.values():
+            stack.enter_context(lock)
+        _pipelines.clear()
+
+
+def model_version(name):
+    """
+    Identifier of the model behind name (model id or loader, plus int8
+    when quantized), for versioning cached results
+    """
+    from .cpu_inference import quantization_enabled
+
+    spec = MODEL_SPECS[name]
+    version = spec.__name__.lstrip("_") if callable(spec) else spec[1]
+    return f"{version}+int8" if quantization_enabled() else version
+
+
+def run_local(name, inputs, **params):
+    """
+    Batched inference in this process
+
+    inputs is a list; the result has one entry per input, tokenized in
+    dynamically padded batches of batch_size. Calls to the same
+    pipeline are serialized, since pipelines are not safe to share between
+    concurrent calls (unless the pipeline is marked thread_safe, like the
+    MusicGen scheduler, which batches concurrent calls itself).
+    """
+    from .cpu_inference import inference_context
+
+    if name not in MODEL_SPECS:
+        raise ModelServerError(f"Unknown model: {name}")
+    pipe = load_model(name)
+    params.setdefault("batch_size", DEFAULT_BATCH_SIZE)
+    inputs = list(inputs)
+
+    # Batches are padded to their longest text, so batch texts of similar
+    # length together and restore the caller's order afterwards
+    order = list(range(len(inputs)))
+    if len(inputs) > 1 and all(isinstance(text, str) for text in inputs):
+        order.sort(key=lambda index: len(inputs[index]))
+
+    lock = contextlib.nullcontext() if getattr(pipe, "thread_safe", False) else _model_locks[name]
+    with lock, inference_context():
+        outputs = pipe([inputs[index] for index in order], **params)
+    if len(inputs) == 1 and not isinstance(outputs, list):
+        outputs = [outputs]
+
+    restored = [None] * len(inputs)
+    for index, output in zip(order, outputs):
+        restored[index] = output
+    return restored
+
+
+def _encode(value):
+    """
+    JSON-safe form of a pipeline output (arrays become base64 float32)
+    """
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value, dtype=np.float32)
+        return {"__ndarray__": base64.b64encode(array.tobytes()).decode("ascii"), "shape": list(array.shape)}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "numpy"):  # torch tensors
+        return _encode(value.detach().cpu().numpy())
+    return value
+
+
+def _decode(value):
+    """
+    Inverse of _encode
+    """
+    if isinstance(value, dict):
+        if "__ndarray__" in value:
+            array = np.frombuffer(base64.b64decode(value["__ndarray__"]), dtype=np.float32)
+            return array.reshape(value["shape"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+# ----------------------
+# Server
+# ----------------------
+
+class _ModelRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict/<model> {"inputs": [...], "params": {...}} -> {"outputs": [...]}
+    GET /health -> {"status": "ok", "loaded": [...]}
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            return self._send(404, {"error": "Not found"})
+        loaded = [name for name in MODEL_SPECS if name in _pipelines]
+        return self._send(200, {"status": "ok", "loaded": loaded})
+
+    def do_POST(self):
+        prefix = "/predict/"
+        if not self.path.startswith(prefix):
+            return self._send(404, {"error": "Not found"})
+        name = self.path[len(prefix):].strip("/")
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            inputs = payload.get("inputs")
+            if not isinstance(inputs, list):
+                return self._send(400, {"error": "inputs must be a list"})
+            outputs = run_local(name, inputs, **payload.get("params", {}))
+        except ModelServerError as e:
+            return self._send(404, {"error": str(e)})
+        except Exception as e:
+            return self._send(500, {"error": str(e)})
+        return self._send(200, {"outputs": _encode(outputs)})
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=8765, preload=()):
+    """
+    Run the model server until interrupted
+
+    Models listed in preload are loaded before the socket opens, so the
+    first request never pays the cold load; others load on first use.
+    """
+    for name in preload:
+        print(f"Loading {name}...")
+        load_model(name)
+
+    server = ThreadingHTTPServer((host, port), _ModelRequestHandler)
+    server.daemon_threads = True
+    print(f"Model server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ----------------------
+# Client
+# ----------------------
+
+class ModelClient:
+    """
+    Thin client for the model server with in-process fallback
+
+    With no server URL configured, or while the server is unreachable,
+    inference runs in this process. After a connection failure the server
+    is skipped for retry_after seconds so requests do not keep waiting on
+    connect timeouts. A server that accepted the request but timed out or
+    dropped the connection is busy, not gone: that raises ModelServerError
+    instead of loading the model into this process.
+    """
+
+    def __init__(self, url=None, timeout=60.0, retry_after=30.0):
+        self.url = (url or "").rstrip("/")
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    def infer(self, name, inputs, timeout=None, **params):
+        """
+        Run model name on a list of inputs; returns one output per input
+        """
+        inputs = list(inputs)
+        if self.url and time.monotonic() >= self._down_until:
+            try:
+                return self._remote(name, inputs, params, timeout or self.timeout)
+            except urllib.error.HTTPError as e:
+                raise ModelServerError(self._error_message(e)) from e
+            except urllib.error.URLError as e:
+                # Raised while connecting: refused, unreachable or connect timeout
+                self._down_until = time.monotonic() + self.retry_after
+                print(f"Model server unavailable ({e.reason}); using in-process inference")
+            except (ConnectionError, TimeoutError) as e:
+                # The server accepted the request and is (or was) working on it;
+                # loading the model here as well would only add to the load
+                raise ModelServerError(f"Model server did not answer: {e}") from e
+        return run_local(name, inputs, **params)
+
+    def _remote(self, name, inputs, params, timeout):
+        body = json.dumps({"inputs": inputs, "params": params}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/predict/{name}",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return _decode(json.loads(response.read())["outputs"])
+
+    @staticmethod
+    def _error_message(error):
+        try:
+            return json.loads(error.read()).get("error", str(error))
+        except ValueError:
+            return str(error)
+
+
+_model_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_client():
+    """
+    Get or create the model client (singleton)
+
+    MODEL_SERVER_URL (e.g. http://127.0.0.1:8765) enables the server;
+    MODEL_SERVER_TIMEOUT sets the request timeout in seconds.
+    """
+    global _model_client
+    if _model_client is None:
+        with _client_lock:
+            if _model_client is None:
+                _model_client = ModelClient(
+                    url=os.getenv("MODEL_SERVER_URL"),
+                    timeout=float(os.getenv("MODEL_SERVER_TIMEOUT", "60")),
+                )
+    return _model_client
+
+
+def infer(name, inputs, **params):
+    """
+    Batched inference through the model server (or in-process fallback)
+    """
+    return get_model_client().infer(name, inputs, **params)
@@ -1,5 +1,13 @@
-from textblob import TextBlob
+import hashlib
 import re
+from importlib.metadata import version
+
+from .analysis_cache import cached_analysis
+from .keyword_matcher import MATCHER_VERSION, KeywordMatcher
+from .lazy_imports import lazy_import
+
+# TextBlob (and NLTK under it) takes about a second to import; load it on first analysis
+textblob = lazy_import('textblob')
 
 # Enhanced mood keywords for better sentiment analysis
 MOOD_KEYWORDS = {
@@ -13,6 +21,38 @@ MOOD_KEYWORDS = {
     'nostalgic': ['nostalgic', 'memories', 'remember', 'past', 'old times', 'throwback', 'reminisce', 'miss']
 }
 
+# Inflected forms that still count as a keyword; only listed forms match, so
+# unrelated words ("fund", "pasted", "dated") are not read as "fun", "past", "date"
+MOOD_INFLECTIONS = {
+    'love': ['loved', 'loves', 'loving'],
+    'tears': ['tear'],
+    'hurt': ['hurts', 'hurting'],
+    'pain': ['pains', 'painful'],
+    'party': ['parties', 'partying'],
+    'dance': ['dances', 'danced', 'dancing'],
+    'chill': ['chilling', 'chilled'],
+    'relax': ['relaxed', 'relaxing'],
+    'meditate': ['meditating', 'meditation'],
+    'hate': ['hated', 'hates'],
+    'rage': ['raging'],
+    'heart': ['hearts'],
+    'date': ['dates', 'dating'],
+    'fear': ['fears', 'feared'],
+    'panic': ['panicked', 'panicking'],
+    'memories': ['memory'],
+    'remember': ['remembered', 'remembering'],
+    'reminisce': ['reminiscing'],
+    'miss': ['missed', 'missing'],
+}
+
+MOOD_MATCHER = KeywordMatcher(MOOD_KEYWORDS, MOOD_INFLECTIONS)
+
+# Cache version: TextBlob's lexicon plus the keyword tables and matcher, so changing any invalidates results
+ANALYSIS_VERSION = "textblob-{}-{}-m{}".format(
+    version("textblob"), hashlib.sha256(repr((MOOD_KEYWORDS, MOOD_INFLECTIONS)).encode()).hexdigest()[:8],
+    MATCHER_VERSION)
+
+@cached_analysis('textblob_mood', ANALYSIS_VERSION)
 def predict_mood_and_sentiment(text):
     """
     Enhanced mood prediction with sentiment analysis
@@ -21,23 +61,18 @@ def predict_mood_and_sentiment(text):
     - sentiment_score: polarity (-1 to 1)
     - confidence: confidence score (0 to 1)
     - emotions: dict of detected emotions with scores
+    Results are cached by normalized text (see analysis_cache)
     """
     if not text or not text.strip():
         return None, 0.0, 0.0, {}
     
     # Sentiment analysis using TextBlob
-    blob = TextBlob(text)
+    blob = textblob.TextBlob(text)
     polarity = blob.sentiment.polarity  # -1.0 .. 1.0
     subjectivity = blob.sentiment.subjectivity  # 0.0 .. 1.0
     
-    txt = text.lower()
-    
-    # Count mood keyword matches
-    mood_scores = {}
-    for mood, keywords in MOOD_KEYWORDS.items():
-        score = sum(1 for keyword in keywords if keyword in txt)
-        if score > 0:
-            mood_scores[mood] = score
+    # Count mood keyword matches (whole words, one pass over the text)
+    mood_scores = MOOD_MATCHER.counts(text)
     
     # Determine primary mood based on keywords and polarity
     if mood_scores:
@@ -0,0 +1,294 @@
+"""
+Shared MusicGen Holder
+One lazily loaded, thread-safe MusicGen model per process for every generation path,
+with a micro-batching scheduler that coalesces concurrent prompts into one generate call
+"""
+
+import gc
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+MUSICGEN_MODEL_ID = os.getenv("MUSICGEN_MODEL", "facebook/musicgen-small")
+
+# MusicGen produces 50 audio tokens per second of output
+TOKENS_PER_SECOND = 50
+
+
+def _patch_musicgen_config():
+    """
+    Add decoder/text_encoder accessors that some transformers versions
+    expect on the MusicGen config classes
+    """
+    from transformers.models.musicgen.configuration_musicgen import MusicgenConfig, MusicgenDecoderConfig
+
+    for config_class in (MusicgenDecoderConfig, MusicgenConfig):
+        for attribute in ('decoder', 'text_encoder'):
+            if not hasattr(config_class, attribute):
+                setattr(config_class, attribute,
+                        property(lambda self, attribute=attribute: self.__dict__.get(attribute, {})))
+
+
+class MusicGenHolder:
+    """
+    Keeps the MusicGen processor and model resident between requests
+
+    The model is loaded on first use (or by warmup()) under a lock, so
+    concurrent first requests load it once. Generation is serialized: one
+    MusicGen forward pass already uses every core, and running them side
+    by side would only multiply activation memory. release() drops the
+    model and returns its memory.
+    """
+
+    def __init__(self, model_id=MUSICGEN_MODEL_ID):
+        self.model_id = model_id
+        self._processor = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """
+        (processor, model), loading them if needed
+        """
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from transformers import AutoProcessor, MusicgenForConditionalGeneration
+
+                    from .cpu_inference import configure_threads, quantization_enabled, quantize_model
+
+                    configure_threads()
+                    try:
+                        model = MusicgenForConditionalGeneration.from_pretrained(self.model_id)
+                    except AttributeError:
+                        # Older checkpoints trip over config attribute names
+                        _patch_musicgen_config()
+                        model = MusicgenForConditionalGeneration.from_pretrained(self.model_id)
+                    model.eval()
+                    if quantization_enabled():
+                        # Covers the T5 text encoder and the decoder; EnCodec is convolutional and stays fp32
+                        model = quantize_model(model)
+                    self._processor = AutoProcessor.from_pretrained(self.model_id)
+                    self._model = model
+        return self._processor, self._model
+
+    @property
+    def sampling_rate(self):
+        _, model = self.load()
+        return model.config.audio_encoder.sampling_rate
+
+    def generate(self, prompts, duration_seconds=10, do_sample=True, guidance_scale=None):
+        """
+        Generate audio for a batch of prompts
+
+        Args:
+            prompts: List of text prompts (or a single string)
+            duration_seconds: Length of each clip
+            do_sample: Sample instead of greedy decoding
+            guidance_scale: Optional classifier-free guidance scale
+
+        Returns:
+            tuple: (float32 array of shape (len(prompts), samples), sampling rate)
+        """
+        import torch
+
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        processor, model = self.load()
+
+        kwargs = {"max_new_tokens": max(1, int(duration_seconds * TOKENS_PER_SECOND)), "do_sample": do_sample}
+        if guidance_scale is not None:
+            kwargs["guidance_scale"] = guidance_scale
+
+        inputs = processor(text=list(prompts), padding=True, return_tensors="pt")
+        with self._generate_lock, torch.inference_mode():
+            audio_values = model.generate(**inputs, **kwargs)
+
+        # (batch, channels, samples) -> mono (batch, samples)
+        audio = audio_values.cpu().numpy().astype(np.float32)
+        if audio.ndim == 3:
+            audio = audio.mean(axis=1)
+        return audio, model.config.audio_encoder.sampling_rate
+
+    def warmup(self):
+        """
+        Load the model and run one tiny generation so the first request
+        does not pay for lazy initialization
+        """
+        self.generate(["warmup"], duration_seconds=0.2, do_sample=False)
+
+    def release(self):
+        """
+        Drop the model and free its memory (it reloads on next use)
+        """
+        with self._load_lock, self._generate_lock:
+            self._processor = None
+            self._model = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+# Global instance
+_musicgen = None
+_musicgen_lock = threading.Lock()
+
+
+def get_musicgen():
+    """
+    Get or create the shared MusicGen holder (singleton)
+    """
+    global _musicgen
+    if _musicgen is None:
+        with _musicgen_lock:
+            if _musicgen is None:
+                _musicgen = MusicGenHolder()
+    return _musicgen
+
+
+class MusicGenBatcher:
+    """
+    Coalesce concurrent prompts into batched MusicGen generate calls
+
+    Requests are grouped by duration bucket and sampling options. A group
+    is dispatched once it holds max_batch_size prompts or its oldest
+    prompt has waited max_wait seconds; one generate call covers the
+    whole group (at its longest duration) and each waiter gets its own
+    clip trimmed to the length it asked for. The decoder cost per step
+    barely grows with batch size on CPU, so concurrent requests share
+    most of the work. Requests arriving while a batch runs queue up for
+    the next one.
+    """
+
+    def __init__(self, holder, max_batch_size=4, max_wait=0.2, bucket_seconds=5):
+        self.holder = holder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.bucket_seconds = bucket_seconds
+        self._pending = {}  # (bucket, do_sample, guidance_scale) -> [(arrival, prompt, seconds, future)]
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def bucket(self, duration_seconds):
+        """
+        Duration bucket a request is batched in
+        """
+        if not self.bucket_seconds:
+            return duration_seconds
+        return max(1, -(-duration_seconds // self.bucket_seconds)) * self.bucket_seconds
+
+    def submit(self, prompt, duration_seconds=10, do_sample=True, guidance_scale=None):
+        """
+        Queue one prompt; returns a Future for (float32 samples, sampling rate)
+        """
+        future = Future()
+        key = (self.bucket(duration_seconds), do_sample, guidance_scale)
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._dispatch_loop, name="musicgen-batcher", daemon=True)
+                self._thread.start()
+            self._pending.setdefault(key, []).append((time.monotonic(), prompt, duration_seconds, future))
+            self._condition.notify()
+        return future
+
+    def generate(self, prompt, duration_seconds=10, timeout=None, **kwargs):
+        """
+        Generate one clip through the scheduler and wait for it
+
+        Returns:
+            tuple: (float32 samples, sampling rate)
+        """
+        return self.submit(prompt, duration_seconds, **kwargs).result(timeout)
+
+    def as_pipeline(self):
+        """
+        Callable with the text-to-audio pipeline's calling convention
+        (for the model server); every input goes through the scheduler
+        """
+        def pipe(inputs, batch_size=None, forward_params=None, **kwargs):
+            forward_params = dict(forward_params or {})
+            seconds = forward_params.pop("max_new_tokens", 10 * TOKENS_PER_SECOND) / TOKENS_PER_SECOND
+            futures = [self.submit(text, seconds, **forward_params) for text in inputs]
+            return [{"audio": clip, "sampling_rate": sampling_rate}
+                    for clip, sampling_rate in (future.result() for future in futures)]
+        # Batching happens across callers, so they must not be serialized
+        pipe.thread_safe = True
+        return pipe
+
+    def _next_batch(self):
+        """
+        Block until a group is due, then take up to max_batch_size from it
+        """
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                key, group = min(self._pending.items(), key=lambda item: item[1][0][0])
+                remaining = group[0][0] + self.max_wait - time.monotonic()
+                if len(group) >= self.max_batch_size or remaining <= 0:
+                    batch = group[:self.max_batch_size]
+                    del group[:self.max_batch_size]
+                    if not group:
+                        del self._pending[key]
+                    return key, batch
+                self._condition.wait(remaining)
+
+    def _dispatch_loop(self):
+        while True:
+            key, batch = self._next_batch()
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if batch:
+                self._run(key, batch)
+
+    def _run(self, key, batch):
+        _, do_sample, guidance_scale = key
+        prompts = [prompt for _, prompt, _, _ in batch]
+        seconds = max(duration for _, _, duration, _ in batch)
+        try:
+            audio, sampling_rate = self.holder.generate(prompts, seconds, do_sample=do_sample,
+                                                        guidance_scale=guidance_scale)
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+        for clip, (_, _, duration, future) in zip(audio, batch):
+            future.set_result((clip[:int(round(duration * sampling_rate))], sampling_rate))
+
+
+_batcher = None
+
+
+def get_musicgen_batcher():
+    """
+    Get or create the MusicGen batching scheduler (singleton)
+
+    MUSICGEN_MAX_BATCH, MUSICGEN_BATCH_WAIT_MS and MUSICGEN_BUCKET_SECONDS
+    tune the batch size, collection window and duration grouping.
+    """
+    global _batcher
+    if _batcher is None:
+        holder = get_musicgen()
+        with _musicgen_lock:
+            if _batcher is None:
+                _batcher = MusicGenBatcher(
+                    holder,
+                    max_batch_size=int(os.getenv("MUSICGEN_MAX_BATCH", "4")),
+                    max_wait=float(os.getenv("MUSICGEN_BATCH_WAIT_MS", "200")) / 1000,
+                    bucket_seconds=float(os.getenv("MUSICGEN_BUCKET_SECONDS", "5")),
+                )
+    return _batcher
@@ -0,0 +1,133 @@
+"""
+Content-Addressed Render Cache
+Stores deterministic renders on disk under a hash of their inputs
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+class RenderCache:
+    """
+    Size-bounded, content-addressed file cache with LRU eviction
+
+    Entries are files named <key>.<extension> inside directory. Hits are
+    recorded in memory rather than by touching the file, so cached files
+    keep a stable mtime (Last-Modified and ETag of served clips do not
+    change). Eviction orders entries by their last hit in this process,
+    or their mtime when they were not hit, and removes the least recently
+    used until the cache fits in max_bytes. Entries can be evicted at any
+    time; files that must outlive the cache are published out of it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._last_used = {}  # path -> wall-clock time of the last hit
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Pickled into worker processes; hit times stay with this process
+        return {'directory': self.directory, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['max_bytes'])
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Stable hash of JSON-serializable key parts
+        """
+        payload = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def path_for(self, key, extension):
+        """
+        Cache path for a key, whether or not it exists yet
+        """
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def get(self, key, extension):
+        """
+        Path of a cached entry, or None on a miss
+        """
+        path = self.path_for(key, extension)
+        if not os.path.exists(path):
+            return None
+        self.touch(path)
+        return path
+
+    def touch(self, path):
+        """
+        Record a hit on a cached file for LRU ordering
+        """
+        with self._lock:
+            self._last_used[path] = time.time()
+
+    def publish(self, path, directory):
+        """
+        Durable copy of a cached file in directory, under the same name
+
+        The copy is a hard link where the filesystem allows it, so it costs
+        no space until the cache evicts its own link. An existing copy is
+        reused; cached files are immutable.
+        """
+        target = os.path.join(directory, os.path.basename(path))
+        if os.path.exists(target):
+            return target
+        temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(path, temp_path)
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        os.replace(temp_path, target)
+        return target
+
+    def temp_path(self, extension):
+        """
+        Fresh temporary path inside the cache directory for writing an entry
+        """
+        fd, path = tempfile.mkstemp(suffix=f".{extension}.tmp", dir=self.directory)
+        os.close(fd)
+        return path
+
+    def commit(self, temp_path, key, extension):
+        """
+        Atomically move a finished temp file into the cache and evict
+        """
+        path = self.path_for(key, extension)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits max_bytes
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                last_used = max(stat.st_mtime, self._last_used.get(entry.path, 0.0))
+                entries.append((last_used, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._last_used.pop(path, None)
+                total -= size
@@ -1,3 +1,251 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .file_serving import file_etag, serve_generated_file
+from .jobs import JobRejected, claim_next_job, enqueue_job, fail_stale_jobs, run_job
+from .keyword_matcher import KeywordMatcher
+from .models import RenderJob
+from .mood_predictor import MOOD_MATCHER
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def test_matches_whole_words_only(self):
+        self.assertNotIn('pain', MOOD_MATCHER.matches("Trip to Spain"))
+        self.assertNotIn('happy', MOOD_MATCHER.matches("I am unhappy"))
+        self.assertIn('unhappy', MOOD_MATCHER.matches("I am unhappy"))
+        self.assertNotIn('mad', MOOD_MATCHER.matches("I made dinner"))
+
+    def test_unlisted_inflections_do_not_match(self):
+        self.assertNotIn('fun', MOOD_MATCHER.matches("Raising a fund"))
+        self.assertNotIn('past', MOOD_MATCHER.matches("I pasted the link"))
+        self.assertNotIn('date', MOOD_MATCHER.matches("That looks dated"))
+
+    def test_listed_inflections_match(self):
+        self.assertIn('relax', MOOD_MATCHER.matches("Feeling relaxed tonight"))
+        self.assertIn('hurt', MOOD_MATCHER.matches("It's hurting"))
+        self.assertEqual(MOOD_MATCHER.first_group("Relaxing by the sea"), 'calm')
+
+    def test_phrases_and_punctuation(self):
+        self.assertIn('fired up', MOOD_MATCHER.matches("So FIRED   up, let's go!"))
+        self.assertIn('sad', MOOD_MATCHER.matches("sad..."))
+
+    def test_counts_in_definition_order(self):
+        matcher = KeywordMatcher({'a': ['x', 'y'], 'b': ['y']})
+        self.assertEqual(list(matcher.counts("y x")), ['a', 'b'])
+        self.assertEqual(matcher.counts("y x"), {'a': 2, 'b': 1})
+
+    def test_unknown_inflection_keyword(self):
+        with self.assertRaises(ValueError):
+            KeywordMatcher({'a': ['x']}, {'z': ['zs']})
+
+
+@override_settings(GENERATED_MEDIA_SENDFILE=None)
+class ServeGeneratedFileTests(SimpleTestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'clip.wav')
+        with open(self.path, 'wb') as f:
+            f.write(self.CONTENT)
+        self.etag = file_etag(self.path)
+        self.mtime = os.stat(self.path).st_mtime
+
+    def get(self, **headers):
+        request = RequestFactory().get('/api/audio/clip.wav', **headers)
+        response = serve_generated_file(request, self.path, 'audio/wav')
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_response_has_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.CONTENT)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_closed_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.CONTENT[10:20])
+
+    def test_open_ended_range(self):
+        response = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.CONTENT[1000:])
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.CONTENT[-24:])
+
+        # A suffix longer than the file covers all of it
+        response = self.get(HTTP_RANGE='bytes=-5000')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-1023/1024')
+
+    def test_end_past_size_is_clamped(self):
+        response = self.get(HTTP_RANGE='bytes=1020-9999')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+
+    def test_multi_and_malformed_ranges_serve_the_whole_file(self):
+        for header in ('bytes=0-1,5-6', 'bytes=abc', 'items=0-1', 'bytes=-'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=1024-', 'bytes=2000-3000', 'bytes=-0', 'bytes=20-10'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_if_none_match(self):
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+        # Weak comparison: a W/ prefix still matches
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'"other", W/{self.etag}').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='*').status_code, 304)
+        response = self.get(HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_response_keeps_validators(self):
+        response = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response.content, b'')
+
+    def test_if_none_match_wins_over_if_modified_since(self):
+        response = self.get(HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=http_date(self.mtime + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(self.mtime + 60)).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(self.mtime - 3600)).status_code, 200)
+
+    def test_if_range_with_current_etag(self):
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_if_range_with_stale_or_weak_etag_serves_the_whole_file(self):
+        for validator in ('"stale"', f'W/{self.etag}'):
+            response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200, validator)
+            self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_if_range_with_date(self):
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.mtime + 60))
+        self.assertEqual(response.status_code, 206)
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.mtime - 3600))
+        self.assertEqual(response.status_code, 200)
+
+    def test_unsatisfiable_range_ignored_when_if_range_fails(self):
+        response = self.get(HTTP_RANGE='bytes=5000-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(RENDER_JOB_MAX_QUEUE_DEPTH=3, RENDER_JOB_MAX_ACTIVE_PER_USER=2,
+                   RENDER_JOB_STALE_AFTER_SECONDS=600)
+class RenderJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='p')
+        handlers = mock.patch.dict('api.jobs.JOB_HANDLERS', {'audio': lambda user, params: {'ok': params['n']}})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def enqueue(self, user=None, n=0):
+        return enqueue_job(user or self.user, 'audio', {'n': n})
+
+    def test_per_user_limit(self):
+        self.enqueue()
+        self.enqueue()
+        with self.assertRaises(JobRejected):
+            self.enqueue()
+        self.assertEqual(RenderJob.objects.count(), 2)
+
+    def test_queue_depth_limit(self):
+        for i in range(3):
+            self.enqueue(User.objects.create_user(f'user{i}', password='p'))
+        with self.assertRaises(JobRejected):
+            self.enqueue()
+
+    def test_finished_jobs_free_the_user_slot(self):
+        self.enqueue()
+        self.enqueue()
+        run_job(claim_next_job())
+        self.enqueue()
+
+    def test_claims_oldest_job_once(self):
+        first = self.enqueue(n=1)
+        second = self.enqueue(n=2)
+        self.assertEqual(claim_next_job().pk, first.pk)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_worker_losing_the_claim_race_takes_the_next_job(self):
+        first = self.enqueue(n=1)
+        second = self.enqueue(n=2)
+        real_first = QuerySet.first
+        stolen = []
+
+        def first_then_steal(queryset):
+            # Another worker claims the job between this worker's read and its UPDATE
+            job = real_first(queryset)
+            if job is not None and not stolen:
+                stolen.append(job.pk)
+                RenderJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+            return job
+
+        with mock.patch.object(QuerySet, 'first', first_then_steal):
+            claimed = claim_next_job()
+        self.assertEqual(stolen, [first.pk])
+        self.assertEqual(claimed.pk, second.pk)
+
+    def test_run_job_stores_the_result(self):
+        self.enqueue(n=7)
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, 'done')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('done', {'ok': 7}))
+
+    def test_finish_after_stale_failure_keeps_failed(self):
+        self.enqueue()
+        job = claim_next_job()
+        RenderJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        job.refresh_from_db()
+        self.assertEqual(fail_stale_jobs(), 1)
+
+        finished = run_job(job)
+        self.assertEqual(finished.status, 'failed')
+        self.assertEqual(RenderJob.objects.get(pk=job.pk).status, 'failed')
+
+    def test_finish_after_reclaim_leaves_the_new_claim_alone(self):
+        self.enqueue(n=3)
+        stale = claim_next_job()
+        # The job is requeued and another worker claims it
+        RenderJob.objects.filter(pk=stale.pk).update(status='queued')
+        with mock.patch('api.jobs.timezone.now', return_value=stale.started_at + timedelta(seconds=5)):
+            current = claim_next_job()
+        self.assertEqual(current.pk, stale.pk)
+
+        run_job(stale)
+        self.assertEqual(RenderJob.objects.get(pk=stale.pk).status, 'running')
+
+        run_job(current)
+        job = RenderJob.objects.get(pk=stale.pk)
+        self.assertEqual((job.status, job.result), ('done', {'ok': 3}))
@@ -0,0 +1,72 @@
+"""
+Shared Text Analyzer
+Sentiment and the 7-way emotion distribution from a single emotion-model forward pass
+"""
+
+# Labels of j-hartmann/emotion-english-distilroberta-base, by polarity
+POSITIVE_EMOTIONS = ("joy", "surprise")
+NEGATIVE_EMOTIONS = ("anger", "disgust", "fear", "sadness")
+
+
+def _scores(result):
+    """
+    Flat list of {"label", "score"} for one input's emotion output
+    """
+    if isinstance(result, list) and result and isinstance(result[0], list):
+        result = result[0]
+    if isinstance(result, dict):
+        result = [result]
+    return result
+
+
+def sentiment_from_emotions(scores):
+    """
+    Binary sentiment ({"label": POSITIVE|NEGATIVE, "score"}) in the
+    sentiment pipeline's format, from an emotion distribution
+
+    The polar emotions' probability mass decides the label; "neutral" mass
+    is left out, so the score is the winning side's share of the polar mass.
+    """
+    by_label = {item["label"].lower(): item["score"] for item in _scores(scores)}
+    positive = sum(by_label.get(label, 0.0) for label in POSITIVE_EMOTIONS)
+    negative = sum(by_label.get(label, 0.0) for label in NEGATIVE_EMOTIONS)
+    total = positive + negative
+    if total <= 0:
+        return {"label": "POSITIVE", "score": 0.5}
+    if positive >= negative:
+        return {"label": "POSITIVE", "score": positive / total}
+    return {"label": "NEGATIVE", "score": negative / total}
+
+
+class TextAnalyzer:
+    """
+    Pipeline-compatible callable producing both analyses in one pass
+
+    Each input yields {"emotions": [...], "sentiment": {...}}. The emotion
+    model runs once per text through run_local (so it shares that model's
+    lock, length-sorted batching and quantization), and the sentiment is
+    derived from its distribution instead of a second transformer. The
+    two original models use different tokenizers and encoders, so one
+    encoder pass cannot feed both of their heads.
+    """
+
+    # run_local serializes the underlying emotion pipeline itself
+    thread_safe = True
+
+    def __call__(self, inputs, **params):
+        from .model_server import run_local
+
+        emotions = run_local("emotion", list(inputs), **params)
+        return [
+            {"emotions": _scores(result), "sentiment": sentiment_from_emotions(result)}
+            for result in emotions
+        ]
+
+    def sentiment_pipeline(self):
+        """
+        Callable with the sentiment-analysis pipeline's calling convention
+        """
+        def pipe(inputs, **params):
+            return [result["sentiment"] for result in self(inputs, **params)]
+        pipe.thread_safe = True
+        return pipe
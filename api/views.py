@@ -1,44 +1,49 @@
 import json
+import os
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import MusicHistory, UserProfile, Playlist, PlaylistTrack, Favorite, Download
+from .models import MusicHistory, UserProfile, Playlist, PlaylistTrack, Favorite, Download, RenderJob
 from .serializers import (MusicHistorySerializer, UserProfileSerializer, PlaylistSerializer, 
                          PlaylistTrackSerializer, FavoriteSerializer, DownloadSerializer)
 from .spotify_client import get_song_by_mood_genre_language, get_playlist_by_mood_genre_language, get_recommendations_by_mood
 from .ml_mood_predictor import predict_mood_and_sentiment, analyze_text_sentiment
 from .music_generator import get_music_generator
-# Import audio generator with error handling
-try:
+from .file_serving import file_view, serve_generated_file
+from .audio_encoders import encoder_for_filename, get_encoder, negotiate_encoder
+from .jobs import JobRejected, enqueue_job, job_status, record_audio_history, render_audio, render_midi
+from .lazy_imports import module_available
+
+# The generators (numpy, scipy, soundfile, midiutil) are imported on first
+# use, so worker boot and management commands do not pay for them
+AUDIO_GENERATOR_AVAILABLE = module_available('numpy')
+MIDI_GENERATOR_AVAILABLE = module_available('numpy') and module_available('midiutil')
+
+
+def get_audio_generator():
     from .audio_generator import get_audio_generator
-    AUDIO_GENERATOR_AVAILABLE = True
-except Exception as e:
-    print(f"Warning: Audio generator import failed: {e}")
-    AUDIO_GENERATOR_AVAILABLE = False
-    get_audio_generator = None
-
-try:
-    from .midi_music_generator import get_midi_generator
-    MIDI_GENERATOR_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: MIDI generator not available: {e}")
-    MIDI_GENERATOR_AVAILABLE = False
-    get_midi_generator = None
-import os
-from django.http import FileResponse, Http404
+    return get_audio_generator()
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def generate_audio(request):
+
+AUDIO_STREAM_CONTENT_TYPES = {
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+}
+
+AUDIO_SAMPLE_FORMATS = ('pcm16', 'pcm24', 'float32')
+
+def _parse_audio_request(request):
     """
-    Generate 40-second audio clip based on mood and sentiment
-    Accepts JSON: { "title": optional string, "mood": optional string, "text": optional text for mood pred, "intensity": optional float }
+    Shared request parsing for the audio generation endpoints
+    Returns (title, mood, sentiment_score, intensity, sentiment_analysis)
     """
-    user = request.user
     title = (request.data.get('title') or "").strip() or None
     mood = (request.data.get('mood') or "").strip() or None
     text = (request.data.get('text') or "").strip() or None
@@ -76,54 +81,144 @@ def generate_audio(request):
             'emotions': emotions
         }
     
+    return title, mood, sentiment_score, intensity, sentiment_analysis
+
+def _wants_async(request):
+    """
+    True when the client asked for the render to run as a background job
+    """
+    value = request.data.get('async', False)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+def _enqueue_render(user, kind, params):
+    """
+    Queue a render job and build the 202 response (429 when the queue is full)
+    """
+    try:
+        job = enqueue_job(user, kind, params)
+    except JobRejected as e:
+        return Response({'error': str(e)}, status=429)
+    return Response({
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': f"/api/jobs/{job.pk}/"
+    }, status=202)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_audio(request):
+    """
+    Generate 40-second audio clip based on mood and sentiment
+    Accepts JSON: { "title": optional string, "mood": optional string, "text": optional text for mood pred, "intensity": optional float, "seed": optional int, "sample_format": optional "pcm16" (default), "pcm24" or "float32", "format": optional "wav", "flac", "ogg", "opus" or "mp3", "async": optional bool }
+    The output format comes from "format" only (WAV by default); the Accept header of this POST is not used.
+    To let the client's Accept header choose, request the returned audio_url without its extension (see serve_audio).
+    A seed makes the render deterministic and lets repeat requests hit the render cache.
+    With "async" the render is queued and a job id is returned with status 202.
+    """
+    user = request.user
+    title, mood, sentiment_score, intensity, sentiment_analysis = _parse_audio_request(request)
+    seed = request.data.get('seed')
+    sample_format = (request.data.get('sample_format') or "pcm16").strip().lower()
+    
     if not mood:
         return Response({'error': 'Mood not provided and no text to predict from'}, status=400)
     
+    if sample_format not in AUDIO_SAMPLE_FORMATS:
+        return Response({'error': f'Unsupported sample format: {sample_format}'}, status=400)
+    
+    encoder = get_encoder(request.data.get('format') or 'wav')
+    if encoder is None:
+        return Response({'error': f"Unsupported audio format: {request.data.get('format')}"}, status=400)
+    
+    if seed is not None:
+        try:
+            seed = int(seed)
+            if seed < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': 'seed must be a non-negative integer'}, status=400)
+    
+    if not AUDIO_GENERATOR_AVAILABLE:
+        return Response({
+            'error': 'Audio generation not available. Please ensure you are running in the virtual environment with: pip install soundfile scipy'
+        }, status=500)
+    
+    params = {
+        'title': title,
+        'mood': mood,
+        'sentiment_score': sentiment_score,
+        'intensity': intensity,
+        'seed': seed,
+        'sample_format': sample_format,
+        'audio_format': encoder.name,
+        'sentiment_analysis': sentiment_analysis
+    }
+    
+    if _wants_async(request):
+        return _enqueue_render(user, 'audio', params)
+    
+    try:
+        return Response(render_audio(user, params))
+        
+    except Exception as e:
+        return Response({'error': f'Failed to generate audio: {str(e)}'}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_audio_stream(request):
+    """
+    Stream a generated audio clip to the client while it is rendered
+    Accepts the same JSON as generate_audio plus "format": optional "wav" (default) or "flac"
+    FLAC supports the pcm16 and pcm24 sample formats only.
+    The persisted file's URL is returned in the X-Audio-Url header.
+    """
+    user = request.user
+    title, mood, sentiment_score, intensity, _ = _parse_audio_request(request)
+    audio_format = (request.data.get('format') or "wav").strip().lower()
+    sample_format = (request.data.get('sample_format') or "pcm16").strip().lower()
+    
+    if not mood:
+        return Response({'error': 'Mood not provided and no text to predict from'}, status=400)
+    
+    if audio_format not in AUDIO_STREAM_CONTENT_TYPES:
+        return Response({'error': f'Unsupported format: {audio_format}'}, status=400)
+    
+    if sample_format not in AUDIO_SAMPLE_FORMATS or (audio_format == 'flac' and sample_format == 'float32'):
+        return Response({'error': f'Unsupported sample format for {audio_format}: {sample_format}'}, status=400)
+    
     try:
         if not AUDIO_GENERATOR_AVAILABLE:
             return Response({
                 'error': 'Audio generation not available. Please ensure you are running in the virtual environment with: pip install soundfile scipy'
             }, status=500)
         
-        # Generate audio
         audio_generator = get_audio_generator()
-        audio_filepath = audio_generator.generate_mood_audio(mood, sentiment_score, intensity)
-        
-        # Save generation info in history
-        song_title = title if title else f"{mood.title()} Audio Clip"
-        MusicHistory.objects.create(
-            user=user,
-            mood=mood,
-            genre="Generated Audio",
-            language="",
-            spotify_song_url=f"/api/audio/{os.path.basename(audio_filepath)}",
-            song_name=song_title,
-            artist_name="NexGenMusic AI"
+        audio_filepath, chunks = audio_generator.stream_mood_audio(
+            mood, sentiment_score, intensity, audio_format, sample_format=sample_format
         )
         
-        response_data = {
-            'audio_url': f"/api/audio/{os.path.basename(audio_filepath)}",
-            'mood': mood,
-            'intensity': intensity,
-            'sentiment_score': sentiment_score,
-            'duration': 40,
-            'filename': os.path.basename(audio_filepath)
-        }
-        
-        if sentiment_analysis:
-            response_data['sentiment_analysis'] = sentiment_analysis
-        
-        return Response(response_data)
+        # Save generation info in history
+        record_audio_history(user, mood, title, audio_filepath)
         
     except Exception as e:
         return Response({'error': f'Failed to generate audio: {str(e)}'}, status=500)
+    
+    response = StreamingHttpResponse(chunks, content_type=AUDIO_STREAM_CONTENT_TYPES[audio_format])
+    response['Content-Disposition'] = f'inline; filename="{os.path.basename(audio_filepath)}"'
+    response['X-Audio-Url'] = f"/api/audio/{os.path.basename(audio_filepath)}"
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass chunks through as they arrive
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_midi_music(request):
     """
     Generate MIDI-based music from mood detection
-    Accepts JSON: { "text": string, "duration": optional int (default 40) }
+    Accepts JSON: { "text": string, "duration": optional int (default 40), "include_midi": optional bool, "async": optional bool }
+    The .mid file is only kept (and midi_url set) when "include_midi" is true.
+    With "async" the render is queued and a job id is returned with status 202.
     """
     user = request.user
     text = (request.data.get('text') or "").strip()
@@ -139,61 +234,83 @@ def generate_midi_music(request):
     except:
         duration = 40
     
+    if not MIDI_GENERATOR_AVAILABLE:
+        return Response({'error': 'MIDI generation not available. Please install required libraries: pip install midiutil'}, status=500)
+    
+    include_midi = request.data.get('include_midi', False)
+    if isinstance(include_midi, str):
+        include_midi = include_midi.strip().lower() in ('1', 'true', 'yes')
+    
+    params = {'text': text, 'duration': duration, 'include_midi': bool(include_midi)}
+    
+    if _wants_async(request):
+        return _enqueue_render(user, 'midi', params)
+    
     try:
-        if not MIDI_GENERATOR_AVAILABLE:
-            return Response({'error': 'MIDI generation not available. Please install required libraries: pip install midiutil'}, status=500)
-        
-        # Generate MIDI music
-        midi_generator = get_midi_generator()
-        result = midi_generator.generate_music_from_text(text, duration)
-        
-        # Save generation info in history
-        MusicHistory.objects.create(
-            user=user,
-            mood=result['mood'],
-            genre="MIDI Generated",
-            language="",
-            spotify_song_url=f"/api/music/{os.path.basename(result['midi_file'])}",
-            song_name=f"{result['mood'].title()} MIDI Melody",
-            artist_name="NexGenMusic MIDI AI"
-        )
-        
-        response_data = {
-            'midi_url': f"/api/music/{os.path.basename(result['midi_file'])}",
-            'wav_url': f"/api/music/{os.path.basename(result['wav_file'])}" if result['wav_file'] else None,
-            'mood': result['mood'],
-            'tempo': result['tempo'],
-            'duration': result['duration'],
-            'sentiment_score': result['sentiment_score'],
-            'confidence': result['confidence'],
-            'melody_length': result['melody_length'],
-            'instrument': result['instrument'],
-            'notes_used': result['notes_used']
-        }
-        
-        return Response(response_data)
+        return Response(render_midi(user, params))
         
     except Exception as e:
         return Response({'error': f'Failed to generate MIDI music: {str(e)}'}, status=500)
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_detail(request, job_id):
+    """
+    Poll the status of a background render job
+    Returns the render result once status is "done"
+    """
+    try:
+        job = RenderJob.objects.get(pk=job_id, user=request.user)
+    except RenderJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=404)
+    
+    return Response(job_status(job))
+
+@api_view(['GET'])
+@file_view
 def serve_audio(request, filename):
     """
     Serve generated audio files
+    Renditions (.flac, .ogg, .opus, .mp3) of a rendered WAV are encoded on first request.
+    A filename without an extension picks the rendition from the Accept header (WAV by default)
+    and the response varies on Accept; a filename with an extension always serves that format.
     """
     audio_dir = "generated_audio"
+    stem, extension = os.path.splitext(filename)
+    negotiated = not extension
+    if negotiated:
+        filename = f"{stem}.{negotiate_encoder(request.META.get('HTTP_ACCEPT')).extension}"
     filepath = os.path.join(audio_dir, filename)
     
+    if not os.path.exists(filepath):
+        # Links recorded before seeded renders were published out of the render cache
+        filepath = os.path.join(audio_dir, "cache", filename)
+    
+    encoder = encoder_for_filename(filename)
+    
+    if not os.path.exists(filepath) and encoder is not None and AUDIO_GENERATOR_AVAILABLE:
+        stem = os.path.splitext(filename)[0]
+        for directory in (audio_dir, os.path.join(audio_dir, "cache")):
+            master = os.path.join(directory, f"{stem}.wav")
+            if os.path.exists(master):
+                try:
+                    filepath = get_audio_generator().encode(master, encoder.name)
+                except ValueError:
+                    pass
+                break
+    
     if not os.path.exists(filepath):
         raise Http404("Audio file not found")
     
-    return FileResponse(
-        open(filepath, 'rb'),
-        as_attachment=False,
-        content_type='audio/wav'
-    )
+    content_type = encoder.content_type if encoder is not None else 'audio/wav'
+    
+    response = serve_generated_file(request, filepath, content_type)
+    if negotiated:
+        patch_vary_headers(response, ['Accept'])
+    return response
 
 @api_view(['GET'])
+@file_view
 def serve_music(request, filename):
     """
     Serve generated MIDI/music files
@@ -206,11 +323,7 @@ def serve_music(request, filename):
     
     content_type = 'audio/midi' if filename.endswith('.mid') else 'audio/wav'
     
-    return FileResponse(
-        open(filepath, 'rb'),
-        as_attachment=False,
-        content_type=content_type
-    )
+    return serve_generated_file(request, filepath, content_type)
 
 @api_view(['POST'])
 def register(request):
@@ -476,6 +589,39 @@ def analyze_sentiment(request):
     return Response(analysis)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_sentiment_batch(request):
+    """
+    Analyze sentiment and mood for many texts in one call
+    Accepts JSON: { "texts": [string, ...] }
+    """
+    texts = request.data.get('texts')
+    max_texts = getattr(settings, 'ANALYZE_BATCH_MAX_TEXTS', 256)
+
+    if not isinstance(texts, list) or not texts:
+        return Response({'error': 'texts must be a non-empty list'}, status=400)
+    if len(texts) > max_texts:
+        return Response({'error': f'At most {max_texts} texts per request'}, status=400)
+    if not all(isinstance(text, str) and text.strip() for text in texts):
+        return Response({'error': 'Every text must be a non-empty string'}, status=400)
+
+    texts = [text.strip() for text in texts]
+    try:
+        from .ml import predict_sentiment_and_mood_batch
+
+        predictions = predict_sentiment_and_mood_batch(texts)
+    except Exception as e:
+        return Response({'error': f'Sentiment analysis failed: {str(e)}'}, status=500)
+
+    return Response({
+        'results': [
+            {'text': text, 'mood': mood, 'sentiment': sentiment}
+            for text, (mood, sentiment) in zip(texts, predictions)
+        ]
+    })
+
+
 # User Profile Views
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
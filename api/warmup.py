@@ -0,0 +1,78 @@
+"""
+Warmup
+Load generators and models in the serving process before it takes requests
+"""
+
+import os
+import time
+
+
+def warm_audio():
+    from .audio_generator import get_audio_generator, get_sample_bank
+
+    generator = get_audio_generator()
+    get_sample_bank().warm(generator.sample_rate)
+
+
+def warm_midi():
+    from .midi_music_generator import get_midi_generator
+
+    get_midi_generator()
+
+
+# In-process generator caches that can be warmed (models are named as in MODEL_SPECS)
+WARMUP_STEPS = {
+    'audio': warm_audio,
+    'midi': warm_midi,
+}
+
+
+def warm_model(name):
+    """
+    Load a model: in this process, or in the model server when
+    MODEL_SERVER_URL is set (MusicGen always loads here)
+    """
+    if name == 'musicgen':
+        from .musicgen import get_musicgen
+
+        get_musicgen().warmup()
+        return
+
+    from .model_server import infer
+
+    infer(name, ["warmup"])
+
+
+def warm(targets):
+    """
+    Warm each target (a WARMUP_STEPS name or a model name)
+
+    Yields (target, seconds, error) per target; a failed target does not
+    stop the others.
+    """
+    for target in targets:
+        started = time.perf_counter()
+        try:
+            if target in WARMUP_STEPS:
+                WARMUP_STEPS[target]()
+            else:
+                warm_model(target)
+        except Exception as e:
+            yield target, time.perf_counter() - started, e
+            continue
+        yield target, time.perf_counter() - started, None
+
+
+def warm_on_start():
+    """
+    Warm the targets listed in WARMUP_ON_START (e.g. "audio,midi,sentiment")
+
+    Called from the WSGI/ASGI entry points, so each gunicorn worker warms
+    its own caches before serving; management commands are unaffected.
+    """
+    targets = [target.strip() for target in os.getenv("WARMUP_ON_START", "").split(',') if target.strip()]
+    for target, seconds, error in warm(targets):
+        if error is not None:
+            print(f"Warmup of {target} failed after {seconds:.2f}s: {error}")
+        else:
+            print(f"Warmed {target} in {seconds:.2f}s")
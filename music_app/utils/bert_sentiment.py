@@ -1,35 +1,65 @@
-import os
-from transformers import pipeline
-
-# Load fine-tuned sentiment model
-model_path = os.path.join(os.path.dirname(__file__), "../../sentiment_model")
-sentiment_classifier = pipeline("sentiment-analysis", model=model_path)
-
-def predict_sentiment(text: str):
-    """
-    Predicts sentiment (POSITIVE/NEGATIVE/NEUTRAL) for a given text.
-    Includes custom logic for slang terms.
-    """
-    # Custom override for positive slang terms
-    text_lower = text.lower()
-    positive_words = ["chill", "cool", "awesome", "great", "fantastic", "amazing", "wonderful", "excellent"]
-    if any(word in text_lower for word in positive_words):
-        return "POSITIVE"
-
-    # Custom override for neutral terms
-    neutral_words = ["okay", "alright", "fine", "neutral", "nothing special", "average", "meh"]
-    if any(word in text_lower for word in neutral_words):
-        return "NEUTRAL"
-
-    result = sentiment_classifier(text)[0]
-    label = result["label"].lower()
-
-    # Direct mapping for cardiffnlp model
-    if label == "positive":
-        return "POSITIVE"
-    elif label == "negative":
-        return "NEGATIVE"
-    elif label == "neutral":
-        return "NEUTRAL"
-    else:
-        return "NEUTRAL"  # Default fallback
+from functools import lru_cache
+
+from api.analysis_cache import AnalysisCache
+from api.keyword_matcher import MATCHER_VERSION, KeywordMatcher
+from api.model_server import infer, model_version
+
+# The fine-tuned sentiment model (sentiment_model/) is served as
+# "finetuned_sentiment" by the model server, or loaded in-process on first use
+
+# Keyword overrides, checked in this order: positive slang terms, then neutral terms
+KEYWORD_SENTIMENTS = KeywordMatcher({
+    "POSITIVE": ["chill", "cool", "awesome", "great", "fantastic", "amazing", "wonderful", "excellent"],
+    "NEUTRAL": ["okay", "alright", "fine", "neutral", "nothing special", "average", "meh"],
+})
+
+def _keyword_sentiment(text: str):
+    """
+    Sentiment forced by slang/neutral keywords, or None to ask the model
+    """
+    return KEYWORD_SENTIMENTS.first_group(text)
+
+def _label_to_sentiment(result):
+    if isinstance(result, list):
+        result = result[0]
+    label = result["label"].lower()
+
+    # Direct mapping for cardiffnlp model
+    if label == "positive":
+        return "POSITIVE"
+    elif label == "negative":
+        return "NEGATIVE"
+    elif label == "neutral":
+        return "NEUTRAL"
+    else:
+        return "NEUTRAL"  # Default fallback
+
+def predict_sentiment(text: str):
+    """
+    Predicts sentiment (POSITIVE/NEGATIVE/NEUTRAL) for a given text.
+    Includes custom logic for slang terms.
+    """
+    return predict_sentiments([text])[0]
+
+def predict_sentiments(texts, batch_size: int = 32):
+    """
+    Predicts sentiment for a list of texts.
+    Texts settled by the keyword overrides skip the model; the rest go
+    through it in one call, in dynamically padded batches of batch_size.
+    Results are cached by normalized text.
+    """
+    return _analysis_cache().get_or_compute(texts, lambda pending: _predict_batch(pending, batch_size))
+
+@lru_cache(maxsize=None)
+def _analysis_cache():
+    return AnalysisCache("finetuned_sentiment", lambda: f"{model_version('finetuned_sentiment')}-m{MATCHER_VERSION}",
+                         casefold=False)
+
+def _predict_batch(texts, batch_size):
+    labels = [_keyword_sentiment(text) for text in texts]
+    pending = [index for index, label in enumerate(labels) if label is None]
+    if pending:
+        results = infer("finetuned_sentiment", [texts[index] for index in pending], batch_size=batch_size)
+        for index, result in zip(pending, results):
+            labels[index] = _label_to_sentiment(result)
+    return labels
@@ -1,50 +1,73 @@
-from transformers import pipeline
-
-# Lazy loading of the emotion classification model
-emotion_classifier = None
-
-def predict_mood(text: str):
-    """
-    Predicts the top emotion for a given text using a fine-tuned RoBERTa model.
-    Uses improved mapping and confidence thresholds for better accuracy.
-    """
-    global emotion_classifier
-    if emotion_classifier is None:
-        emotion_classifier = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", return_all_scores=True)
-
-    result = emotion_classifier(text)[0]
-    top_emotion = max(result, key=lambda x: x["score"])
-
-    # Get confidence score
-    confidence = top_emotion["score"]
-
-    # Simplified emotion to mood mapping - only three categories
-    emotion_to_mood = {
-        "joy": "happy",
-        "anger": "energetic",
-        "sadness": "sad",
-        "fear": "energetic",
-        "surprise": "happy",
-        "disgust": "energetic",
-        "neutral": "energetic"
-    }
-
-    # Special handling for low confidence predictions - all categories for Spotify analysis
-    if confidence < 0.3:
-        # For low confidence, check for explicit mood words
-        text_lower = text.lower()
-        if any(word in text_lower for word in ["happy", "joy", "excited", "great", "wonderful", "amazing"]):
-            return "happy"
-        elif any(word in text_lower for word in ["sad", "depressed", "unhappy", "terrible", "awful", "horrible"]):
-            return "sad"
-        elif any(word in text_lower for word in ["angry", "mad", "furious", "annoyed", "hate", "frustrated", "nervous", "anxious", "worried", "stressed", "motivated", "determined", "focused"]):
-            return "energetic"
-        elif any(word in text_lower for word in ["calm", "peaceful", "relaxed", "neutral", "okay", "chill", "cool"]):
-            return "calm"
-
-    # For negative sentiment words, override neutral predictions
-    text_lower = text.lower()
-    if any(word in text_lower for word in ["terrible", "awful", "horrible", "bad", "worst"]) and top_emotion["label"] == "neutral":
-        return "sad"
-
-    return emotion_to_mood.get(top_emotion["label"], "calm")
+from functools import lru_cache
+
+from api.analysis_cache import AnalysisCache
+from api.keyword_matcher import MATCHER_VERSION, KeywordMatcher
+from api.model_server import infer, model_version
+
+# Explicit mood words for low-confidence predictions, checked in this order
+LOW_CONFIDENCE_MOODS = KeywordMatcher({
+    "happy": ["happy", "joy", "excited", "great", "wonderful", "amazing"],
+    "sad": ["sad", "depressed", "unhappy", "terrible", "awful", "horrible"],
+    "energetic": ["angry", "mad", "furious", "annoyed", "hate", "frustrated", "nervous", "anxious", "worried", "stressed", "motivated", "determined", "focused"],
+    "calm": ["calm", "peaceful", "relaxed", "neutral", "okay", "chill", "cool"],
+})
+
+# Negative words that turn a neutral prediction into "sad"
+NEGATIVE_WORDS = KeywordMatcher({"negative": ["terrible", "awful", "horrible", "bad", "worst"]})
+
+def predict_mood(text: str):
+    """
+    Predicts the top emotion for a given text using a fine-tuned RoBERTa model.
+    Uses improved mapping and confidence thresholds for better accuracy.
+    """
+    return predict_moods([text])[0]
+
+def predict_moods(texts, batch_size: int = 32):
+    """
+    Predicts the mood for a list of texts with one call to the emotion
+    model, in dynamically padded batches of batch_size.
+    Results are cached by normalized text.
+    """
+    return _analysis_cache().get_or_compute(texts, lambda pending: _predict_batch(pending, batch_size))
+
+@lru_cache(maxsize=None)
+def _analysis_cache():
+    return AnalysisCache("emotion_mood", lambda: f"{model_version('emotion')}-m{MATCHER_VERSION}", casefold=False)
+
+def _predict_batch(texts, batch_size):
+    # All emotion scores for each text, from the shared "emotion" model
+    results = infer("emotion", texts, batch_size=batch_size)
+    return [_mood_from_scores(text, result) for text, result in zip(texts, results)]
+
+def _mood_from_scores(text: str, result):
+    """
+    Map the emotion scores for text to a mood
+    """
+    top_emotion = max(result, key=lambda x: x["score"])
+
+    # Get confidence score
+    confidence = top_emotion["score"]
+
+    # Simplified emotion to mood mapping - only three categories
+    emotion_to_mood = {
+        "joy": "happy",
+        "anger": "energetic",
+        "sadness": "sad",
+        "fear": "energetic",
+        "surprise": "happy",
+        "disgust": "energetic",
+        "neutral": "energetic"
+    }
+
+    # Special handling for low confidence predictions - all categories for Spotify analysis
+    if confidence < 0.3:
+        # For low confidence, check for explicit mood words
+        mood = LOW_CONFIDENCE_MOODS.first_group(text)
+        if mood:
+            return mood
+
+    # For negative sentiment words, override neutral predictions
+    if top_emotion["label"] == "neutral" and NEGATIVE_WORDS.matches(text):
+        return "sad"
+
+    return emotion_to_mood.get(top_emotion["label"], "calm")
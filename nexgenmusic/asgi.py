@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nexgenmusic.settings')
 
 application = get_asgi_application()
+
+# WARMUP_ON_START (e.g. "audio,midi,sentiment") warms each serving process before its first request
+from api.warmup import warm_on_start  # noqa: E402 (needs the app registry set up above)
+
+warm_on_start()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -97,3 +98,34 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
 }
+
+# Background render jobs (see api/jobs.py)
+RENDER_JOB_MAX_QUEUE_DEPTH = int(os.getenv("RENDER_JOB_MAX_QUEUE_DEPTH", "100"))
+RENDER_JOB_MAX_ACTIVE_PER_USER = int(os.getenv("RENDER_JOB_MAX_ACTIVE_PER_USER", "2"))
+RENDER_JOB_STALE_AFTER_SECONDS = int(os.getenv("RENDER_JOB_STALE_AFTER_SECONDS", "600"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared tier of the text analysis cache (see api/analysis_cache.py); the
+    # file backend is shared by every worker on the host without extra services.
+    # Kept in the temp dir by default so it never lands in the source tree
+    "analysis": {
+        "BACKEND": os.getenv("ANALYSIS_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("ANALYSIS_CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "nexgenmusic", "analysis")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "100000"))},
+    },
+}
+
+# Text analysis cache: in-process LRU entries and lifetime (seconds) of cached results
+ANALYSIS_CACHE_LRU_SIZE = int(os.getenv("ANALYSIS_CACHE_LRU_SIZE", "4096"))
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Maximum texts per POST /api/analyze-sentiment/batch/ request
+ANALYZE_BATCH_MAX_TEXTS = int(os.getenv("ANALYZE_BATCH_MAX_TEXTS", "256"))
+
+# Generated media serving (see api/file_serving.py)
+# Set GENERATED_MEDIA_SENDFILE to "x-sendfile" or "x-accel-redirect" to let the front proxy send files
+GENERATED_MEDIA_SENDFILE = os.getenv("GENERATED_MEDIA_SENDFILE") or None
+GENERATED_MEDIA_ACCEL_PREFIX = os.getenv("GENERATED_MEDIA_ACCEL_PREFIX", "/protected/")
@@ -26,9 +26,12 @@ urlpatterns = [
     path('api/generate/', views.generate_music),
     path('api/generate-playlist/', views.generate_playlist),
     path('api/analyze-sentiment/', views.analyze_sentiment),
+    path('api/analyze-sentiment/batch/', views.analyze_sentiment_batch),
     path('api/history/', views.history),
     path('api/generate-audio/', views.generate_audio),
+    path('api/generate-audio/stream/', views.generate_audio_stream),
     path('api/generate-midi/', views.generate_midi_music),
+    path('api/jobs/<int:job_id>/', views.job_detail),
     path('api/audio/<str:filename>', views.serve_audio),
     path('api/music/<str:filename>', views.serve_music),
     
@@ -1,19 +1,29 @@
-<<<<<<< HEAD
 #!/usr/bin/env python
 """
 Test script to evaluate sentiment and mood prediction accuracy using Kaggle datasets
+
+Run with --quantized to also evaluate the int8 dynamically quantized
+models (MODEL_QUANTIZE=1) and report accuracy drift and speedup against fp32.
+
+Run with --shared to score the "sentiment" model both ways on the IMDB
+sample: the SST-2 model, and the sentiment derived from the emotion model
+(SHARED_TEXT_ENCODER=1). It reports whether the shared path reaches parity.
 """
 
+import argparse
+import os
+import time
+
 import kagglehub
 import pandas as pd
 from sklearn.metrics import accuracy_score, classification_report
-from music_app.utils.bert_sentiment import predict_sentiment
-from music_app.utils.mood_predictor import predict_mood
-
-def test_sentiment_accuracy():
-    """Test sentiment analysis accuracy using IMDB dataset"""
-    print("Testing Sentiment Analysis Accuracy...")
+from api.analysis_cache import clear_analysis_caches, set_cache_enabled
+from api.model_server import MODEL_SPECS, SENTIMENT_SPECS, run_local, unload_models
+from music_app.utils.bert_sentiment import predict_sentiments
+from music_app.utils.mood_predictor import predict_moods
 
+def load_sentiment_dataset():
+    """IMDB reviews (50 positive, 50 negative) with POSITIVE/NEGATIVE labels"""
     # Download IMDB dataset
     path = kagglehub.dataset_download("lakshmi25npathi/imdb-dataset-of-50k-movie-reviews")
     df = pd.read_csv(f"{path}/IMDB Dataset.csv")
@@ -26,29 +36,12 @@ def test_sentiment_accuracy():
     # Map ground truth
     sentiment_map = {'positive': 'POSITIVE', 'negative': 'NEGATIVE'}
     true_labels = [sentiment_map[s] for s in test_df['sentiment']]
+    texts = [review[:512] for review in test_df['review']]  # Limit text length
 
-    # Predict sentiments
-    predicted_labels = []
-    for review in test_df['review']:
-        try:
-            pred = predict_sentiment(review[:512])  # Limit text length
-            predicted_labels.append(pred)
-        except Exception as e:
-            print(f"Error predicting sentiment: {e}")
-            predicted_labels.append('POSITIVE')  # Default
-
-    # Calculate accuracy
-    accuracy = accuracy_score(true_labels, predicted_labels)
-    print(".2f")
-    print("\nClassification Report:")
-    print(classification_report(true_labels, predicted_labels))
-
-    return accuracy
-
-def test_mood_accuracy():
-    """Test mood prediction accuracy using emotion dataset"""
-    print("\nTesting Mood Prediction Accuracy...")
+    return texts, true_labels
 
+def load_mood_dataset():
+    """100 emotion dataset entries with emotions mapped to moods"""
     # Download emotion dataset
     path = kagglehub.dataset_download("parulpandey/emotion-dataset")
     df = pd.read_csv(f"{path}/validation.csv")
@@ -67,137 +60,125 @@ def test_mood_accuracy():
         'neutral': 'calm'
     }
 
-    true_labels = []
-    for emotion in test_df['label']:
-        mood = emotion_to_mood.get(emotion, 'calm')
-        true_labels.append(mood)
-
-    # Predict moods
-    predicted_labels = []
-    for text in test_df['text']:
-        try:
-            pred = predict_mood(text)
-            predicted_labels.append(pred)
-        except Exception as e:
-            print(f"Error predicting mood: {e}")
-            predicted_labels.append('calm')  # Default
+    true_labels = [emotion_to_mood.get(emotion, 'calm') for emotion in test_df['label']]
 
-    # Calculate accuracy
-    accuracy = accuracy_score(true_labels, predicted_labels)
-    print(".2f")
-    print("\nClassification Report:")
-    print(classification_report(true_labels, predicted_labels))
-
-    return accuracy
-
-if __name__ == "__main__":
-    print("Evaluating Model Accuracy with Kaggle Datasets\n")
+    return list(test_df['text']), true_labels
 
-    sentiment_acc = test_sentiment_accuracy()
-    mood_acc = test_mood_accuracy()
+def run_predictions(predict_batch, texts, default):
+    """Predict all texts in batches; returns (predictions, seconds taken)"""
+    start = time.perf_counter()
+    try:
+        predicted_labels = predict_batch(texts)
+    except Exception as e:
+        print(f"Error predicting: {e}")
+        predicted_labels = [default] * len(texts)
+    return predicted_labels, time.perf_counter() - start
 
-    print("\nSummary:")
-    print(f"Sentiment Accuracy: {sentiment_acc:.2f}")
-    print(f"Mood Accuracy: {mood_acc:.2f}")
-=======
-#!/usr/bin/env python
-"""
-Test script to evaluate sentiment and mood prediction accuracy using Kaggle datasets
-"""
-
-import kagglehub
-import pandas as pd
-from sklearn.metrics import accuracy_score, classification_report
-from music_app.utils.bert_sentiment import predict_sentiment
-from music_app.utils.mood_predictor import predict_mood
-
-def test_sentiment_accuracy():
+def test_sentiment_accuracy(dataset=None):
     """Test sentiment analysis accuracy using IMDB dataset"""
     print("Testing Sentiment Analysis Accuracy...")
 
-    # Download IMDB dataset
-    path = kagglehub.dataset_download("lakshmi25npathi/imdb-dataset-of-50k-movie-reviews")
-    df = pd.read_csv(f"{path}/IMDB Dataset.csv")
-
-    # Sample 100 reviews for testing (50 positive, 50 negative)
-    positive_reviews = df[df['sentiment'] == 'positive'].sample(50, random_state=42)
-    negative_reviews = df[df['sentiment'] == 'negative'].sample(50, random_state=42)
-    test_df = pd.concat([positive_reviews, negative_reviews])
-
-    # Map ground truth
-    sentiment_map = {'positive': 'POSITIVE', 'negative': 'NEGATIVE'}
-    true_labels = [sentiment_map[s] for s in test_df['sentiment']]
-
-    # Predict sentiments
-    predicted_labels = []
-    for review in test_df['review']:
-        try:
-            pred = predict_sentiment(review[:512])  # Limit text length
-            predicted_labels.append(pred)
-        except Exception as e:
-            print(f"Error predicting sentiment: {e}")
-            predicted_labels.append('POSITIVE')  # Default
+    texts, true_labels = dataset or load_sentiment_dataset()
+    predicted_labels, seconds = run_predictions(predict_sentiments, texts, 'POSITIVE')
 
     # Calculate accuracy
     accuracy = accuracy_score(true_labels, predicted_labels)
-    print(".2f")
+    print(f"Accuracy: {accuracy:.2f} ({seconds:.1f}s)")
     print("\nClassification Report:")
     print(classification_report(true_labels, predicted_labels))
 
-    return accuracy
+    return accuracy, predicted_labels, seconds
 
-def test_mood_accuracy():
+def test_mood_accuracy(dataset=None):
     """Test mood prediction accuracy using emotion dataset"""
     print("\nTesting Mood Prediction Accuracy...")
 
-    # Download emotion dataset
-    path = kagglehub.dataset_download("parulpandey/emotion-dataset")
-    df = pd.read_csv(f"{path}/validation.csv")
-
-    # Sample 100 entries for testing
-    test_df = df.sample(100, random_state=42)
-
-    # Map emotions to moods (simplified mapping)
-    emotion_to_mood = {
-        'joy': 'happy',
-        'anger': 'angry',
-        'sadness': 'sad',
-        'fear': 'calm',
-        'surprise': 'happy',
-        'love': 'happy',
-        'neutral': 'calm'
-    }
-
-    true_labels = []
-    for emotion in test_df['label']:
-        mood = emotion_to_mood.get(emotion, 'calm')
-        true_labels.append(mood)
-
-    # Predict moods
-    predicted_labels = []
-    for text in test_df['text']:
-        try:
-            pred = predict_mood(text)
-            predicted_labels.append(pred)
-        except Exception as e:
-            print(f"Error predicting mood: {e}")
-            predicted_labels.append('calm')  # Default
+    texts, true_labels = dataset or load_mood_dataset()
+    predicted_labels, seconds = run_predictions(predict_moods, texts, 'calm')
 
     # Calculate accuracy
     accuracy = accuracy_score(true_labels, predicted_labels)
-    print(".2f")
+    print(f"Accuracy: {accuracy:.2f} ({seconds:.1f}s)")
     print("\nClassification Report:")
     print(classification_report(true_labels, predicted_labels))
 
-    return accuracy
+    return accuracy, predicted_labels, seconds
+
+def set_quantization(enabled):
+    """Switch MODEL_QUANTIZE and drop loaded models and cached results so the next prediction reloads"""
+    os.environ["MODEL_QUANTIZE"] = "1" if enabled else "0"
+    unload_models()
+    clear_analysis_caches()
+
+def report_drift(name, baseline, quantized):
+    """Print accuracy drift, prediction agreement and speedup of the quantized model"""
+    base_acc, base_preds, base_seconds = baseline
+    quant_acc, quant_preds, quant_seconds = quantized
+    agreement = sum(a == b for a, b in zip(base_preds, quant_preds)) / len(base_preds)
+    print(f"{name}: fp32 {base_acc:.3f} -> int8 {quant_acc:.3f} "
+          f"(drift {quant_acc - base_acc:+.3f}, agreement {agreement:.1%}, "
+          f"speedup {base_seconds / max(quant_seconds, 1e-9):.2f}x)")
+
+def test_shared_sentiment(dataset, tolerance):
+    """Score the SST-2 and emotion-derived "sentiment" models on the same texts; returns whether shared reaches parity"""
+    print("\nComparing SST-2 sentiment with sentiment derived from the emotion model...")
+
+    texts, true_labels = dataset
+    results = {}
+    for variant, spec in SENTIMENT_SPECS.items():
+        MODEL_SPECS["sentiment"] = spec
+        unload_models()
+        predicted_labels, seconds = run_predictions(
+            lambda batch: [result["label"] for result in run_local("sentiment", batch)], texts, 'POSITIVE')
+        accuracy = accuracy_score(true_labels, predicted_labels)
+        print(f"{variant}: accuracy {accuracy:.3f} ({seconds:.1f}s)")
+        results[variant] = (accuracy, predicted_labels, seconds)
+
+    sst2_acc, sst2_preds, sst2_seconds = results["sst2"]
+    shared_acc, shared_preds, shared_seconds = results["shared"]
+    agreement = sum(a == b for a, b in zip(sst2_preds, shared_preds)) / len(sst2_preds)
+    parity = shared_acc >= sst2_acc - tolerance
+    print(f"Shared vs SST-2: accuracy {shared_acc - sst2_acc:+.3f}, agreement {agreement:.1%}, "
+          f"speedup {sst2_seconds / max(shared_seconds, 1e-9):.2f}x")
+    print("Parity reached (within {:.3f}): {}".format(tolerance, "yes" if parity else "no"))
+    return parity
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quantized', action='store_true',
+                        help='Also evaluate int8 dynamic quantization and report drift')
+    parser.add_argument('--shared', action='store_true',
+                        help='Also compare emotion-derived sentiment (SHARED_TEXT_ENCODER) with SST-2')
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='Largest accuracy drop of the shared sentiment still counted as parity')
+    args = parser.parse_args()
+
     print("Evaluating Model Accuracy with Kaggle Datasets\n")
 
-    sentiment_acc = test_sentiment_accuracy()
-    mood_acc = test_mood_accuracy()
+    # Every prediction must reach the model, or timings and drift are meaningless
+    set_cache_enabled(False)
+
+    sentiment_data = load_sentiment_dataset()
+    mood_data = load_mood_dataset()
+
+    if args.quantized:
+        set_quantization(False)
+    sentiment_result = test_sentiment_accuracy(sentiment_data)
+    mood_result = test_mood_accuracy(mood_data)
 
     print("\nSummary:")
-    print(f"Sentiment Accuracy: {sentiment_acc:.2f}")
-    print(f"Mood Accuracy: {mood_acc:.2f}")
->>>>>>> c25426a0d49250110b7f88b1d3e91981b8699196
+    print(f"Sentiment Accuracy: {sentiment_result[0]:.2f}")
+    print(f"Mood Accuracy: {mood_result[0]:.2f}")
+
+    if args.quantized:
+        print("\nEvaluating int8 dynamically quantized models...\n")
+        set_quantization(True)
+        quantized_sentiment = test_sentiment_accuracy(sentiment_data)
+        quantized_mood = test_mood_accuracy(mood_data)
+
+        print("\nQuantization Drift:")
+        report_drift("Sentiment", sentiment_result, quantized_sentiment)
+        report_drift("Mood", mood_result, quantized_mood)
+
+    if args.shared:
+        test_shared_sentiment(sentiment_data, args.tolerance)
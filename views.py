@@ -3,18 +3,21 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.utils import timezone
-from textblob import TextBlob
 import os
 import random
 import uuid
-import torch
-import soundfile as sf
-from transformers import MusicgenForConditionalGeneration, AutoProcessor
+
+from api.lazy_imports import lazy_import
+from api.musicgen import get_musicgen_batcher
 
 from .forms import RegisterForm, UploadForm
 from .models import UploadedImage, SearchHistory
 from .spotify_utils import get_spotify_tracks
 
+# Loaded on first use, not at import
+sf = lazy_import("soundfile")
+textblob = lazy_import("textblob")
+
 
 # ----------------------
 # Helper: Generate AI music
@@ -22,12 +25,9 @@ from .spotify_utils import get_spotify_tracks
 def generate_music(text, output_file):
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     try:
-        processor = AutoProcessor.from_pretrained("facebook/musicgen-small")
-        model = MusicgenForConditionalGeneration.from_pretrained("facebook/musicgen-small")
-        inputs = processor(text=text, return_tensors="pt")
-        with torch.no_grad():
-            generated_audio = model.generate(**inputs, max_duration=10.0)
-        sf.write(output_file, generated_audio.squeeze().cpu().numpy(), samplerate=16000)
+        # Shared resident model; concurrent requests are batched together
+        audio, sampling_rate = get_musicgen_batcher().generate(text, duration_seconds=10)
+        sf.write(output_file, audio, samplerate=sampling_rate)
     except Exception as e:
         print(f"MusicGen model failed: {e}")
         # fallback to silent audio file
@@ -116,7 +116,7 @@ def music_generation_view(request):
         song_type = request.POST.get('song_type', 'Pop')
 
         # --- Sentiment & Mood Detection ---
-        polarity = TextBlob(text_input).sentiment.polarity
+        polarity = textblob.TextBlob(text_input).sentiment.polarity
         if polarity > 0.1:
             sentiment = "Positive"
             mood = "Happy"